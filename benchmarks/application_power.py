@@ -0,0 +1,65 @@
+"""Microbenchmark of `Application.measure_power()` for the V2I application of the smart city traffic scenario.
+
+Compares the current implementation with the previous one, which chained `PowerMeasurement` objects via
+`multiply()`, `functools.reduce` and list concatenation for every task and data flow.
+
+Run from the repository root:
+
+    $ python benchmarks/application_power.py
+"""
+import os
+import sys
+import timeit
+from functools import reduce
+
+sys.path[:0] = [os.path.abspath("."), os.path.abspath("examples/smart_city_traffic")]
+
+import simpy
+
+from examples.smart_city_traffic.city import City
+from examples.smart_city_traffic.mobility import MobilityManager
+from leaf.application import Application
+from leaf.power import PowerMeasurement
+
+REPETITIONS = 20000
+
+
+def measure_power_reference(application: Application) -> PowerMeasurement:
+    """Previous implementation of `Application.measure_power()` that allocates objects for every step."""
+    def sum_(measurements):
+        dynamic, static = reduce(lambda acc, cur: (acc[0] + cur.dynamic, acc[1] + cur.static), measurements, (0, 0))
+        return PowerMeasurement(dynamic, static)
+
+    def task_power(task):
+        if task.cu == 0:  # Tasks without CU on nodes without power model did not work in the previous implementation
+            return PowerMeasurement(0, 0)
+        return task.node.measure_power().multiply(task.cu / task.node.used_cu)
+
+    def data_flow_power(data_flow):
+        return sum_(link.measure_power().multiply(data_flow.bit_rate / link.used_bandwidth)
+                    for link in data_flow.links)
+
+    measurements = [task_power(t) for t in application.tasks()] + [data_flow_power(df) for df in application.data_flows()]
+    return sum_(measurements)
+
+
+def main():
+    env = simpy.Environment()
+    city = City(env)
+    taxi = MobilityManager(city)._create_taxi(env, speed=10)
+    city.add_taxi_and_start_v2i_app(taxi)
+    application = taxi.application
+
+    reference = measure_power_reference(application)
+    current = application.measure_power()
+    assert abs(float(reference) - float(current)) < 1e-9, (reference, current)
+
+    print(f"V2I application with {len(application.tasks())} tasks and {len(application.data_flows())} data flows: "
+          f"{current}")
+    for name, function in [("previous", measure_power_reference), ("current", Application.measure_power)]:
+        seconds = min(timeit.repeat(lambda: function(application), number=REPETITIONS, repeat=5))
+        print(f"{name:>8}: {seconds / REPETITIONS * 1e6:.2f} µs per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark of the memory usage and build time of the `Infrastructure` topology backends.
+
+Builds a random IoT deployment with `n` sensor nodes, each connected to one of `n / 100` gateways via an uplink and a
+downlink, and all gateways connected to a cloud. Memory is measured with `tracemalloc` and includes the nodes and
+links themselves, which are identical for both backends.
+
+Afterwards, the deployment is mutated and used at the same time: Every cycle attaches a new sensor to a random gateway
+and places an application that streams from the sensor via its gateway to the cloud. The time per cycle and the peak
+memory allocated during the cycles show whether a backend has to rebuild derived data structures after every change.
+
+Run from the repository root:
+
+    $ python benchmarks/infrastructure_backends.py [n ...]
+"""
+import gc
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+from typing import Iterator
+
+sys.path[:0] = [os.path.abspath(".")]
+
+import numpy as np
+
+from leaf.application import Application, SourceTask, ProcessingTask, SinkTask
+from leaf.infrastructure import Infrastructure, Node, Link
+from leaf.orchestrator import Orchestrator
+from leaf.power import PowerModelNode, PowerModelLink
+
+DEFAULT_SIZES = [10 ** 4, 10 ** 5]
+MUTATE_THEN_PLACE_CYCLES = 200
+
+
+def create_entities(n: int):
+    rng = np.random.default_rng(seed=0)
+    cloud = Node("cloud", power_model=PowerModelNode(power_per_cu=1))
+    gateways = [Node(f"gateway_{i}", cu=100, power_model=PowerModelNode(max_power=10, static_power=2))
+                for i in range(max(1, n // 100))]
+    sensors = [Node(f"sensor_{i}", cu=1, power_model=PowerModelNode(max_power=1, static_power=0.1))
+               for i in range(n)]
+    links = [Link(gateway, cloud, bandwidth=1e9, power_model=PowerModelLink(1e-9), latency=10) for gateway in gateways]
+    for sensor, gateway_index in zip(sensors, rng.integers(len(gateways), size=n)):
+        gateway = gateways[gateway_index]
+        links.append(Link(sensor, gateway, bandwidth=1e6, power_model=PowerModelLink(1e-8), latency=1))
+        links.append(Link(gateway, sensor, bandwidth=1e6, power_model=PowerModelLink(1e-8), latency=1))
+    return links
+
+
+def build(links, backend: str) -> Infrastructure:
+    infrastructure = Infrastructure(backend=backend)
+    for link in links:
+        infrastructure.add_link(link)
+    return infrastructure
+
+
+class GatewayOrchestrator(Orchestrator):
+    """Places the processing task on the gateway of the application's source sensor."""
+
+    def _processing_task_placement(self, processing_task: ProcessingTask, application: Application) -> Node:
+        source_task = next(task for task in application.tasks() if isinstance(task, SourceTask))
+        return self.infrastructure.out_links(source_task.node.name)[0].dst
+
+
+def mutate_then_place(infrastructure: Infrastructure, orchestrator: Orchestrator, rng: np.random.Generator,
+                      sensor_ids: Iterator[int], cycles: int):
+    """Attach a new sensor to a random gateway and place an application on it, `cycles` times."""
+    cloud = infrastructure.node("cloud")
+    gateways = [link.src for link in infrastructure.in_links("cloud")]
+    for _ in range(cycles):
+        gateway = gateways[rng.integers(len(gateways))]
+        sensor = Node(f"new_sensor_{next(sensor_ids)}", cu=1,
+                      power_model=PowerModelNode(max_power=1, static_power=0.1))
+        infrastructure.add_links([
+            Link(sensor, gateway, bandwidth=1e6, power_model=PowerModelLink(1e-8), latency=1),
+            Link(gateway, sensor, bandwidth=1e6, power_model=PowerModelLink(1e-8), latency=1),
+        ])
+        application = Application()
+        source_task = SourceTask(cu=0.1, bound_node=sensor)
+        processing_task = ProcessingTask(cu=0.01)
+        application.add_task(source_task)
+        application.add_task(processing_task, incoming_data_flows=[(source_task, 1000)])
+        application.add_task(SinkTask(bound_node=cloud), incoming_data_flows=[(processing_task, 100)])
+        orchestrator.place(application)
+
+
+def main(sizes):
+    for n in sizes:
+        gc.collect()
+        tracemalloc.start()
+        links = create_entities(n)
+        entities_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"n={n}: {len(links)} links, nodes and links alone use {entities_memory / 2 ** 20:.1f} MiB")
+        for backend in ["networkx", "compact"]:
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            infrastructure = build(links, backend)
+            duration = time.perf_counter() - start
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert len(infrastructure.links()) == len(links)
+            print(f"{backend:>10}: build {duration:6.2f} s, "
+                  f"{memory / 2 ** 20:7.1f} MiB ({memory / len(links):.0f} B per link) in addition to the entities")
+
+            orchestrator = GatewayOrchestrator(infrastructure)
+            rng = np.random.default_rng(seed=1)
+            sensor_ids = itertools.count()
+            start = time.perf_counter()
+            mutate_then_place(infrastructure, orchestrator, rng, sensor_ids, MUTATE_THEN_PLACE_CYCLES)
+            duration = time.perf_counter() - start
+            gc.collect()
+            tracemalloc.start()
+            mutate_then_place(infrastructure, orchestrator, rng, sensor_ids, MUTATE_THEN_PLACE_CYCLES)
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{'':>10}  mutate-then-place {duration / MUTATE_THEN_PLACE_CYCLES * 1000:7.2f} ms per cycle, "
+                  f"{peak_memory / 2 ** 20:7.1f} MiB peak allocations during {MUTATE_THEN_PLACE_CYCLES} cycles")
+            orchestrator.close()
+            del orchestrator, infrastructure
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
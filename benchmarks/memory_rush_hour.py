@@ -0,0 +1,104 @@
+"""Memory benchmark of the smart city traffic scenario at rush hour.
+
+Simulates 30 minutes around the peak of `TAXI_COUNT_DISTRIBUTION` with `MAX_CARS_PER_MINUTE = 75` (without meters)
+and reports the number of taxis, the peak resident set size of the process and the memory allocated per taxi,
+which includes its node, Wi-Fi link, V2I application, tasks and data flows.
+
+Results on the reference machine (Python 3.11) with dict-based entities (the parent of the commit that introduced
+`__slots__` for core entities and power models) and with slotted entities (that commit), measured by passing the
+respective revisions. RSS varies by a few hundred KiB between runs:
+
+    =======================  ==========  =========
+                             dict-based  slotted
+    =======================  ==========  =========
+    peak taxis                      224        224
+    peak RSS                   78.7 MiB   78.3 MiB
+    allocated per taxi        24.65 KiB  24.13 KiB
+    =======================  ==========  =========
+
+Run from the repository root, optionally passing a git revision to measure the `leaf` package and examples of that
+revision instead of the working tree:
+
+    $ python benchmarks/memory_rush_hour.py [REVISION]
+"""
+import gc
+import io
+import os
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import tracemalloc
+
+sys.path[:0] = [os.path.abspath("."), os.path.abspath("examples/smart_city_traffic")]
+
+import numpy as np
+import simpy
+
+from examples.smart_city_traffic.city import City
+from examples.smart_city_traffic.infrastructure import Taxi
+from examples.smart_city_traffic.mobility import MobilityManager
+from examples.smart_city_traffic.settings import TAXI_COUNT_DISTRIBUTION, MAX_CARS_PER_MINUTE
+
+DURATION = 30 * 60
+TAXIS_PER_MEASUREMENT = 1000
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # Bytes on macOS, KiB on Linux
+
+
+def simulate_rush_hour() -> int:
+    rush_hour = int(np.argmax(TAXI_COUNT_DISTRIBUTION)) * 60 - DURATION // 2
+    env = simpy.Environment(initial_time=rush_hour)
+    city = City(env)
+    env.process(MobilityManager(city).run(env))
+    peak_taxis = 0
+    for until in range(rush_hour + 1, rush_hour + DURATION):
+        env.run(until=until)
+        peak_taxis = max(peak_taxis, len(city.infrastructure.nodes(type_filter=Taxi)))
+    return peak_taxis
+
+
+def allocated_per_taxi() -> float:
+    env = simpy.Environment()
+    city = City(env)
+    mobility_manager = MobilityManager(city)
+    gc.collect()
+    tracemalloc.start()
+    taxis = []
+    for _ in range(TAXIS_PER_MEASUREMENT):
+        taxi = mobility_manager._create_taxi(env, speed=10)
+        city.add_taxi_and_start_v2i_app(taxi)
+        taxis.append(taxi)
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / TAXIS_PER_MEASUREMENT
+
+
+def run_at_revision(revision: str):
+    """Run this benchmark in a subprocess on the `leaf` package and examples of another git revision."""
+    archive = subprocess.run(["git", "archive", revision, "leaf", "examples"], check=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+    with tempfile.TemporaryDirectory() as directory:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(directory)
+        subprocess.run([sys.executable, os.path.abspath(__file__)], cwd=directory, check=True)
+
+
+def main():
+    print(f"MAX_CARS_PER_MINUTE = {MAX_CARS_PER_MINUTE}")
+    peak_taxis = simulate_rush_hour()
+    print(f"peak taxis: {peak_taxis}")
+    print(f"peak RSS: {peak_rss_mib():.1f} MiB")
+    print(f"allocated per taxi: {allocated_per_taxi() / 1024:.2f} KiB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_at_revision(sys.argv[1])
+    else:
+        main()
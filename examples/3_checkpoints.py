@@ -0,0 +1,89 @@
+import logging
+import os
+import tempfile
+
+import simpy
+
+from leaf.application import Task
+from leaf.checkpoint import save_checkpoint, load_checkpoint
+from leaf.infrastructure import Node
+from leaf.power import PowerModelNode, PowerMeter, EntityPowerMeter, EnergyMeter
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s\t%(message)s')
+
+SIMULATION_TIME = 20
+CHECKPOINT_TIME = 7
+
+
+def main():
+    """Saves a simulation at `CHECKPOINT_TIME`, restores it and checks that it ends up in the same state as an
+    uninterrupted simulation.
+
+    Log Output:
+        INFO	Uninterrupted: total=600.0 Ws, per entity={'node1': 310.0, 'node2': 290.0}, energy=600.0 Ws
+        INFO	Restored:      total=600.0 Ws, per entity={'node1': 310.0, 'node2': 290.0}, energy=600.0 Ws
+    """
+    env, state = create_simulation()
+    env.run(until=SIMULATION_TIME)
+    uninterrupted = results(state)
+    logger.info(f"Uninterrupted: {uninterrupted}")
+
+    env, state = create_simulation()
+    env.run(until=CHECKPOINT_TIME)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "checkpoint.pkl.gz")
+        save_checkpoint(path, env, state)
+        env, state = load_checkpoint(path)
+    env.run(until=SIMULATION_TIME)
+    restored = results(state)
+    logger.info(f"Restored:      {restored}")
+    assert restored == uninterrupted, "The restored simulation diverged from the uninterrupted one"
+
+
+def create_simulation():
+    """Two nodes whose load changes every few seconds, measured by all types of power meters."""
+    nodes = [Node(f"node{i + 1}", cu=100, power_model=PowerModelNode(max_power=30, static_power=10)) for i in range(2)]
+    meters = {
+        "power": PowerMeter(nodes, name="power_meter"),
+        "entity": EntityPowerMeter(nodes, name="entity_power_meter"),  # Uses the default key
+        "energy": EnergyMeter(nodes, name="energy_meter"),
+    }
+    env = simpy.Environment()
+    workload = Workload(nodes)
+    env.process(workload.run(env))
+    for meter in meters.values():
+        env.process(meter.run(env))
+    return env, {"workload": workload, "meters": meters}
+
+
+def results(state):
+    meters = state["meters"]
+    total = float(sum(float(measurement) for measurement in meters["power"].measurements))
+    per_entity = meters["entity"].energy_per_entity()
+    per_entity = dict(zip(per_entity.index, per_entity["dynamic"] + per_entity["static"]))
+    return f"total={total} Ws, per entity={per_entity}, energy={float(meters['energy'].energy())} Ws"
+
+
+class Workload:
+    def __init__(self, nodes):
+        """Moves a task between the nodes every 3 seconds."""
+        self.nodes = nodes
+        self.task = Task(cu=50)
+
+    def run(self, env: simpy.Environment, delay: float = 0):
+        yield env.timeout(delay)
+        while True:
+            node = self.nodes[int(env.now) // 3 % len(self.nodes)]
+            if self.task.node is not None:
+                self.task.deallocate()
+            self.task.allocate(node)
+            yield env.timeout(3)
+
+    def resume(self, env: simpy.Environment, process):
+        """Called by :func:`~leaf.checkpoint.load_checkpoint` to restart the process where it was interrupted."""
+        env.process(self.run(env, delay=process.delay))
+
+
+if __name__ == '__main__':
+    main()
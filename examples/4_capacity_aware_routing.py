@@ -0,0 +1,74 @@
+import logging
+
+from leaf.application import DataFlow
+from leaf.infrastructure import Node, Link, Infrastructure
+from leaf.orchestrator import CapacityAwareRouting
+from leaf.power import PowerModelLink
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s\t%(message)s')
+
+BIT_RATE = 60
+
+
+def main():
+    """Routes data flows via links with sufficient residual bandwidth and checks that the routing follows topology
+    changes, including elements that are removed and added again within a single batch.
+
+    Log Output:
+        INFO	networkx: Initial route: ['a', 'b', 'c']
+        INFO	networkx: Route while a -> b is saturated: ['a', 'c']
+        INFO	networkx: Route after re-adding b -> c: ['a', 'b', 'c']
+        INFO	networkx: Route after replacing the links of b: ['a', 'b', 'c']
+        INFO	compact: Initial route: ['a', 'b', 'c']
+        INFO	compact: Route while a -> b is saturated: ['a', 'c']
+        INFO	compact: Route after re-adding b -> c: ['a', 'b', 'c']
+        INFO	compact: Route after replacing the links of b: ['a', 'b', 'c']
+    """
+    for backend in ["networkx", "compact"]:
+        infrastructure, a, b, c = create_infrastructure(backend)
+        routing = CapacityAwareRouting(infrastructure)
+        log_route(backend, "Initial route", routing, expected=["a", "b", "c"])
+
+        # Saturate the fast route, so the next data flow has to take the slow direct link
+        data_flow = DataFlow(bit_rate=BIT_RATE)
+        data_flow.allocate(routing.path("a", "c", BIT_RATE))
+        log_route(backend, "Route while a -> b is saturated", routing, expected=["a", "c"])
+        data_flow.deallocate()
+
+        # The subscribers receive the link in both lists of the TopologyChange
+        b_to_c = infrastructure.link("b", "c")
+        with infrastructure.batch():
+            infrastructure.remove_link(b_to_c)
+            infrastructure.add_link(b_to_c)
+        log_route(backend, "Route after re-adding b -> c", routing, expected=["a", "b", "c"])
+
+        with infrastructure.batch():
+            infrastructure.remove_node(b)
+            infrastructure.add_links([Link(a, b, bandwidth=100, power_model=PowerModelLink(0), latency=1),
+                                      Link(b, c, bandwidth=100, power_model=PowerModelLink(0), latency=1)])
+        log_route(backend, "Route after replacing the links of b", routing, expected=["a", "b", "c"])
+        routing.close()
+
+
+def create_infrastructure(backend: str):
+    """A fast route a -> b -> c and a slow direct link a -> c."""
+    infrastructure = Infrastructure(backend=backend)
+    a, b, c = Node("a"), Node("b"), Node("c")
+    infrastructure.add_links([
+        Link(a, b, bandwidth=100, power_model=PowerModelLink(0), latency=1),
+        Link(b, c, bandwidth=100, power_model=PowerModelLink(0), latency=1),
+        Link(a, c, bandwidth=1000, power_model=PowerModelLink(0), latency=10),
+    ])
+    return infrastructure, a, b, c
+
+
+def log_route(backend: str, description: str, routing: CapacityAwareRouting, expected):
+    links = routing.path("a", "c", BIT_RATE)
+    route = [links[0].src.name] + [link.dst.name for link in links]
+    logger.info(f"{backend}: {description}: {route}")
+    assert route == expected, f"Expected {expected}"
+
+
+if __name__ == '__main__':
+    main()
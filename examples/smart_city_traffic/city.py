@@ -1,4 +1,4 @@
-from typing import List, Tuple, Iterator
+from typing import List, Tuple
 
 import networkx as nx
 import simpy
@@ -9,6 +9,7 @@ from mobility import Location
 from examples.smart_city_traffic.orchestrator import CityOrchestrator
 from examples.smart_city_traffic.settings import *
 from leaf.infrastructure import Infrastructure
+from leaf.spatial import SpatialIndex
 
 
 class City:
@@ -16,21 +17,23 @@ class City:
         self.env = env
         self.street_graph, self.entry_point_locations, self.traffic_light_locations = _create_street_graph()
         self.infrastructure = Infrastructure()
+        self.traffic_light_index = SpatialIndex(cell_size=WIFI_RANGE)
         self.orchestrator = CityOrchestrator(self.infrastructure, utilization_threshold=FOG_UTILIZATION_THRESHOLD)
 
         # Create infrastructure
-        self.infrastructure.add_node(Cloud())
-        for location in self.traffic_light_locations:
-            self._add_traffic_light(location)
-        for location in RNG.choice(self.traffic_light_locations, FOG_DCS):
-            self._add_fog_node(location)
+        with self.infrastructure.batch():
+            self.infrastructure.add_node(Cloud())
+            for location in self.traffic_light_locations:
+                self._add_traffic_light(location)
+            for location in RNG.choice(self.traffic_light_locations, FOG_DCS):
+                self._add_fog_node(location)
 
         # Start update wifi connections process
         self.update_wifi_connections_process = self.env.process(self._update_wifi_connections())
 
         # Place CCTV applications
-        for traffic_light in self.infrastructure.nodes(type_filter=TrafficLight):
-            self.orchestrator.place(traffic_light.application)
+        self.orchestrator.place_many(traffic_light.application
+                                     for traffic_light in self.infrastructure.nodes(type_filter=TrafficLight))
 
     def add_taxi_and_start_v2i_app(self, taxi: Taxi):
         """Cars are connected to all traffic light systems in range via WiFi.
@@ -50,6 +53,7 @@ class City:
         traffic_light = TrafficLight(location, application_sink=cloud)
         self.infrastructure.add_link(LinkWanUp(traffic_light, cloud))
         self.infrastructure.add_link(LinkWanDown(cloud, traffic_light))
+        self.traffic_light_index.add(traffic_light)
         for traffic_light_ in self._traffic_lights_in_range(traffic_light):
             self.infrastructure.add_link(LinkWifiBetweenTrafficLights(traffic_light, traffic_light_))
             self.infrastructure.add_link(LinkWifiBetweenTrafficLights(traffic_light_, traffic_light))
@@ -62,25 +66,29 @@ class City:
                 self.infrastructure.add_link(LinkEthernet(traffic_light, fog_node))
                 self.infrastructure.add_link(LinkEthernet(fog_node, traffic_light))
 
-    def _update_wifi_connections(self):
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the Wi-Fi update process after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        self.update_wifi_connections_process = env.process(self._update_wifi_connections(delay=process.delay))
+
+    def _update_wifi_connections(self, delay: float = UPDATE_WIFI_CONNECTIONS_INTERVAL):
         """Recalculates the traffic lights in range for all taxis."""
-        g = self.infrastructure.graph
         while True:
-            yield self.env.timeout(UPDATE_WIFI_CONNECTIONS_INTERVAL)
-            for taxi in self.infrastructure.nodes(type_filter=Taxi):
-                tl_connected_name = next(g.neighbors(taxi.name))
-                tl_closest = self._closest_traffic_light(taxi)
-                if tl_connected_name != tl_closest.name:
-                    g.remove_edge(taxi.name, tl_connected_name)
-                    self.infrastructure.add_link(LinkWifiTaxiToTrafficLight(taxi, tl_closest))
-
-    def _traffic_lights_in_range(self, traffic_light: TrafficLight) -> Iterator[TrafficLight]:
-        for tl in self.infrastructure.nodes(type_filter=TrafficLight):
-            if traffic_light.location.distance(tl.location) <= WIFI_RANGE:
-                yield tl
+            yield self.env.timeout(delay)
+            delay = UPDATE_WIFI_CONNECTIONS_INTERVAL
+            taxis = self.infrastructure.nodes(type_filter=Taxi)
+            closest_traffic_lights = self.traffic_light_index.nearest_many([taxi.location for taxi in taxis])
+            with self.infrastructure.batch():
+                for taxi, tl_closest in zip(taxis, closest_traffic_lights):
+                    wifi_link = self.infrastructure.out_links(taxi.name)[0]
+                    if wifi_link.dst is not tl_closest:
+                        self.infrastructure.remove_link(wifi_link)
+                        self.infrastructure.add_link(LinkWifiTaxiToTrafficLight(taxi, tl_closest))
+
+    def _traffic_lights_in_range(self, traffic_light: TrafficLight) -> List[TrafficLight]:
+        return self.traffic_light_index.in_range(traffic_light.location, WIFI_RANGE)
 
     def _closest_traffic_light(self, taxi: Taxi) -> TrafficLight:
-        return min(self.infrastructure.nodes(type_filter=TrafficLight), key=lambda tl: taxi.location.distance(tl.location))
+        return self.traffic_light_index.nearest(taxi.location)
 
 
 def _create_street_graph() -> Tuple[nx.Graph, List[Location], List[Location]]:
@@ -1,23 +1,64 @@
 import logging
 from os import makedirs
+from typing import Optional
 
+import numpy as np
 import simpy
 from tqdm import tqdm
 
+import examples.smart_city_traffic.infrastructure as city_infrastructure
+import leaf.power
 from examples.smart_city_traffic.city import City
 from examples.smart_city_traffic.infrastructure import Cloud, FogNode, Taxi, LinkWanDown, LinkWanUp, \
     LinkWifiTaxiToTrafficLight, LinkWifiBetweenTrafficLights, TrafficLight
 from examples.smart_city_traffic.mobility import MobilityManager
 from examples.smart_city_traffic.settings import SIMULATION_TIME, FOG_DCS, POWER_MEASUREMENT_INTERVAL, \
-    FOG_IDLE_SHUTDOWN
+    FOG_IDLE_SHUTDOWN, RNG
+from leaf.checkpoint import save_checkpoint, load_checkpoint
 from leaf.infrastructure import Infrastructure
-from leaf.power import PowerMeter
+from leaf.power import MeterGroup, CsvSink, MeasurementBuffer, MeasurementSink
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARN, format='%(levelname)s: %(message)s')
 
 
-def main(count_taxis: bool, measure_infrastructure: bool, measure_applications: bool):
+def main(count_taxis: bool, measure_infrastructure: bool, measure_applications: bool,
+         checkpoint_time: Optional[int] = None, resume_from: Optional[str] = None):
+    """Run the smart city traffic experiment.
+
+    Args:
+        count_taxis: Record the number of taxis
+        measure_infrastructure: Record the power usage of the infrastructure
+        measure_applications: Record the power usage of the applications
+        checkpoint_time: If set, the complete state of the simulation is saved at this time, so other experiments can
+            be forked from it via `resume_from`.
+        resume_from: Path of a checkpoint to continue from instead of starting a new simulation. The measurements
+            are appended to the result files of the checkpointed run.
+    """
+    result_dir = f"results/fog_{FOG_DCS}"
+    if FOG_IDLE_SHUTDOWN:
+        result_dir += "_shutdown"
+    makedirs(result_dir, exist_ok=True)
+
+    if resume_from is None:
+        env, state = _create_experiment(result_dir, count_taxis, measure_infrastructure, measure_applications)
+    else:
+        env, state = load_checkpoint(resume_from, rngs=[RNG])
+        _restore_counters(state["counters"])
+
+    # ------------------ Run experiment -------------------
+    for until in tqdm(range(int(env.now) + 1, SIMULATION_TIME)):
+        env.run(until=until)
+        if until == checkpoint_time:
+            state["counters"] = _counters()
+            save_checkpoint(f"{result_dir}/checkpoint_{until}.pkl.gz", env, state, rngs=[RNG])
+
+    # ------------------ Write results --------------------
+    for meter in state["meters"]:
+        meter.close()
+
+
+def _create_experiment(result_dir: str, count_taxis: bool, measure_infrastructure: bool, measure_applications: bool):
     # ----------------- Set up experiment -----------------
     env = simpy.Environment()
     city = City(env)
@@ -25,70 +66,82 @@ def main(count_taxis: bool, measure_infrastructure: bool, measure_applications:
     env.process(mobility_manager.run(env))
 
     # ----------------- Initialize meters -----------------
+    # Measurements are streamed to CSV files during the simulation, so memory usage does not grow with its duration
+    meters = []
     if count_taxis:
         # Measures the amount of taxis on the map
-        taxi_counter = TaxiCounter(env, city.infrastructure)
+        meters.append(TaxiCounter(env, city.infrastructure, sink=CsvSink(f"{result_dir}/taxis.csv")))
     if measure_infrastructure:
         # Measures the power usage of cloud and fog nodes as well as WAN and WiFi links
-        pm_cloud = PowerMeter(entities=city.infrastructure.nodes(type_filter=Cloud), name="cloud", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        pm_fog = PowerMeter(entities=city.infrastructure.nodes(type_filter=FogNode), name="fog", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        pm_wan_up = PowerMeter(entities=city.infrastructure.links(type_filter=LinkWanUp), name="wan_up", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        pm_wan_down = PowerMeter(entities=city.infrastructure.links(type_filter=LinkWanDown), name="wan_down", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        pm_wifi = PowerMeter(entities=lambda: city.infrastructure.links(type_filter=(LinkWifiBetweenTrafficLights, LinkWifiTaxiToTrafficLight)), name="wifi", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-
-        env.process(pm_cloud.run(env))
-        env.process(pm_fog.run(env))
-        env.process(pm_wan_up.run(env))
-        env.process(pm_wan_down.run(env))
-        env.process(pm_wifi.run(env))
+        selectors = {
+            "cloud": Cloud,
+            "fog": FogNode,
+            "wifi": (LinkWifiBetweenTrafficLights, LinkWifiTaxiToTrafficLight),
+            "wanUp": LinkWanUp,
+            "wanDown": LinkWanDown,
+        }
+        meters.append(MeterGroup(city.infrastructure, selectors, name="infrastructure",
+                                 measurement_interval=POWER_MEASUREMENT_INTERVAL,
+                                 sink=CsvSink(f"{result_dir}/infrastructure.csv")))
     if measure_applications:
         # Measures the power usage of the V2I and CCTV applications
-        pm_v2i = PowerMeter(entities=lambda: [taxi.application for taxi in city.infrastructure.nodes(type_filter=Taxi)], name="v2i", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        pm_cctv = PowerMeter(entities=lambda: [tl.application for tl in city.infrastructure.nodes(type_filter=TrafficLight)], name="cctv", measurement_interval=POWER_MEASUREMENT_INTERVAL)
-        env.process(pm_v2i.run(env))
-        env.process(pm_cctv.run(env))
+        selectors = {
+            "v2i": _v2i_application,
+            "cctv": _cctv_application,
+        }
+        meters.append(MeterGroup(city.infrastructure, selectors, name="applications",
+                                 measurement_interval=POWER_MEASUREMENT_INTERVAL,
+                                 sink=CsvSink(f"{result_dir}/applications.csv")))
+    for meter in meters:
+        env.process(meter.run(env))
+    return env, {"city": city, "mobility_manager": mobility_manager, "meters": meters}
 
-    # ------------------ Run experiment -------------------
-    for until in tqdm(range(1, SIMULATION_TIME)):
-        env.run(until=until)
 
-    # ------------------ Write results --------------------
-    result_dir = f"results/fog_{FOG_DCS}"
-    if FOG_IDLE_SHUTDOWN:
-        result_dir += "_shutdown"
-    makedirs(result_dir, exist_ok=True)
-    if count_taxis:
-        csv_content = "time,taxis\n"
-        for i, taxis in enumerate(taxi_counter.measurements):
-            csv_content += f"{i},{taxis}\n"
-        with open(f"{result_dir}/taxis.csv", 'w') as csvfile:
-            csvfile.write(csv_content)
-    if measure_infrastructure:
-        csv_content = "time,cloud static,cloud dynamic,fog static,fog dynamic,wifi static,wifi dynamic,wanUp static," \
-                      "wanUp dynamic,wanDown static,wanDown dynamic\n"
-        for i, (cloud, fog, wifi, wan_up, wan_down) in enumerate(zip(pm_cloud.measurements, pm_fog.measurements, pm_wifi.measurements, pm_wan_up.measurements, pm_wan_down.measurements)):
-            csv_content += f"{i},{cloud.static},{cloud.dynamic},{fog.static},{fog.dynamic},{wifi.static},{wifi.dynamic},{wan_up.static},{wan_up.dynamic},{wan_down.static},{wan_down.dynamic}\n"
-        with open(f"{result_dir}/infrastructure.csv", 'w') as csvfile:
-            csvfile.write(csv_content)
-    if measure_applications:
-        csv_content = "time,v2i static,v2i dynamic,cctv static,cctv dynamic\n"
-        for i, (v2i, cctv) in enumerate(zip(pm_v2i.measurements, pm_cctv.measurements)):
-            csv_content += f"{i},{v2i.static},{v2i.dynamic},{cctv.static},{cctv.dynamic}\n"
-        with open(f"{result_dir}/applications.csv", 'w') as csvfile:
-            csvfile.write(csv_content)
+def _v2i_application(entity):
+    return entity.application if isinstance(entity, Taxi) else None
+
+
+def _cctv_application(entity):
+    return entity.application if isinstance(entity, TrafficLight) else None
+
+
+def _counters():
+    """Global counters that have to be part of a checkpoint to keep generating unique names."""
+    return {
+        "fog_nodes_created": city_infrastructure._fog_nodes_created,
+        "traffic_lights_created": city_infrastructure._traffic_lights_created,
+        "taxis_created": city_infrastructure._taxis_created,
+        "unnamed_power_meters_created": leaf.power._unnamed_power_meters_created,
+    }
+
+
+def _restore_counters(counters):
+    city_infrastructure._fog_nodes_created = counters["fog_nodes_created"]
+    city_infrastructure._traffic_lights_created = counters["traffic_lights_created"]
+    city_infrastructure._taxis_created = counters["taxis_created"]
+    leaf.power._unnamed_power_meters_created = counters["unnamed_power_meters_created"]
 
 
 class TaxiCounter:
-    def __init__(self, env: simpy.Environment, infrastructure: Infrastructure):
+    def __init__(self, env: simpy.Environment, infrastructure: Infrastructure, sink: Optional[MeasurementSink] = None):
         self.env = env
-        self.measurements = []
-        self.process = env.process(self._run(infrastructure))
+        self.infrastructure = infrastructure
+        # The time column holds the index of the measurement (as in previous versions), so integers suffice
+        self.measurements = MeasurementBuffer(columns=["taxis"], dtype=np.int64, sink=sink)
+        self.count = 0
 
-    def _run(self, infrastructure: Infrastructure):
-        yield self.env.timeout(0.01)
+    def run(self, env: simpy.Environment, delay: float = 0.01):
+        yield env.timeout(delay)
         while True:
-            self.measurements.append(len(infrastructure.nodes(type_filter=Taxi)))
-            yield self.env.timeout(1)
+            self.measurements.append(self.count, len(self.infrastructure.nodes(type_filter=Taxi)))
+            self.count += 1
+            yield env.timeout(1)
+
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        env.process(self.run(env, delay=process.delay))
+
+    def close(self):
+        self.measurements.close()
 
 
 if __name__ == '__main__':
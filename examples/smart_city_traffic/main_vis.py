@@ -3,7 +3,6 @@ import logging
 from os import makedirs
 from typing import Optional, Callable, Dict
 
-import pandas as pd
 import simpy
 from tqdm import tqdm
 
@@ -12,7 +11,7 @@ from examples.smart_city_traffic.mobility import MobilityManager
 from examples.smart_city_traffic.settings import SIMULATION_TIME, FOG_DCS, FOG_IDLE_SHUTDOWN
 from leaf.infrastructure import Infrastructure, Node, Link
 from leaf.mobility import Location
-from leaf.power import PowerMeasurement
+from leaf.power import EntityPowerMeter
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARN, format='%(levelname)s: %(message)s')
@@ -39,30 +38,15 @@ class Visualizer:
             self.cytoscape_layout = cytoscape_layout
         self.default_location = default_location
         self.network_measurements = {}
-        self.node_measurements = []
-        self.link_measurements = []
+        self.node_meter = EntityPowerMeter(infrastructure.nodes, measurement_interval=measurement_interval)
+        self.link_meter = EntityPowerMeter(infrastructure.links, key=self._link_to_id,
+                                           measurement_interval=measurement_interval)
 
     def run(self, env: simpy.Environment):
         while True:
             self.network_measurements[env.now] = self._infrastructure_network()
-            for node in self.infrastructure.nodes():
-                try:
-                    measurement: PowerMeasurement = node.measure_power()
-                except RuntimeError:
-                    continue
-                else:
-                    self.node_measurements.append({"time": env.now, "id": node.name,
-                                                   "static_power": measurement.static,
-                                                   "dynamic_power": measurement.dynamic})
-            for link in self.infrastructure.links():
-                try:
-                    measurement: PowerMeasurement = link.measure_power()
-                except RuntimeError:
-                    continue
-                else:
-                    self.link_measurements.append({"time": env.now, "id": self._link_to_id(link),
-                                                   "static_power": measurement.static,
-                                                   "dynamic_power": measurement.dynamic})
+            self.node_meter.record(env.now)
+            self.link_meter.record(env.now)
             yield env.timeout(self.measurement_interval)
 
     def save(self, outpath):
@@ -74,8 +58,10 @@ class Visualizer:
             }, f)
         with open(f"{outpath}/infrastructure.json", "w") as f:
             json.dump(self.network_measurements, f, separators=(',', ':'))
-        pd.DataFrame(self.node_measurements).to_csv(f"{outpath}/node_measurements.csv", index=False)
-        pd.DataFrame(self.link_measurements).to_csv(f"{outpath}/link_measurements.csv", index=False)
+        for meter, filename in [(self.node_meter, "node_measurements.csv"), (self.link_meter, "link_measurements.csv")]:
+            df = meter.to_dataframe()[["time", "id", "static", "dynamic"]]
+            df.columns = ["time", "id", "static_power", "dynamic_power"]
+            df.to_csv(f"{outpath}/{filename}", index=False)
 
     def _infrastructure_network(self):
         nodes = []
@@ -14,15 +14,29 @@ class MobilityManager:
     def __init__(self, city: "City"):
         self.city = city
 
-    def run(self, env: simpy.Environment):
+    def run(self, env: simpy.Environment, delay: Optional[float] = None):
+        if delay is not None:
+            yield env.timeout(delay)
         while True:
-            for taxi in self._create_taxis(env):
-                self.city.add_taxi_and_start_v2i_app(taxi)
-                env.process(self._remove_taxi_process(env, taxi))
+            for taxi in self.city.infrastructure.nodes(type_filter=Taxi):
+                taxi.moved()  # Taxis derive their location from the simulation time, see Taxi.location
+            with self.city.infrastructure.batch():
+                for taxi in self._create_taxis(env):
+                    self.city.add_taxi_and_start_v2i_app(taxi)
+                    env.process(self._remove_taxi_process(env, taxi))
             yield env.timeout(UPDATE_MOBILITY_INTERVAL)
 
-    def _remove_taxi_process(self, env: simpy.Environment, taxi: "Taxi"):
-        yield env.timeout(taxi.mobility_model.life_time)
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the mobility processes after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        if process.name == "run":
+            env.process(self.run(env, delay=process.delay))
+        elif process.name == "_remove_taxi_process":
+            env.process(self._remove_taxi_process(env, process.arguments["taxi"], delay=process.delay))
+        else:
+            raise ValueError(f"Cannot resume unknown process {process}.")
+
+    def _remove_taxi_process(self, env: simpy.Environment, taxi: "Taxi", delay: Optional[float] = None):
+        yield env.timeout(taxi.mobility_model.life_time if delay is None else delay)
         self.city.remove_taxi_and_stop_v2i_app(taxi)
 
     def _create_taxis(self, env: simpy.Environment) -> List["Taxi"]:
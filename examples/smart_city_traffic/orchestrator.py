@@ -1,34 +1,28 @@
-import math
-
 from leaf.application import Application, ProcessingTask
-from examples.smart_city_traffic.infrastructure import FogNode, Cloud
-from examples.smart_city_traffic.settings import FOG_UTILIZATION_THRESHOLD, FOG_DCS, FOG_IDLE_SHUTDOWN
+from examples.smart_city_traffic.infrastructure import FogNode, Cloud, TrafficLight
+from examples.smart_city_traffic.settings import FOG_UTILIZATION_THRESHOLD, FOG_IDLE_SHUTDOWN
 from leaf.infrastructure import Infrastructure, Node
-from leaf.orchestrator import Orchestrator
+from leaf.orchestrator import Orchestrator, BackboneRouting, CapacityIndex
 
 
 class CityOrchestrator(Orchestrator):
 
     def __init__(self, infrastructure: Infrastructure, utilization_threshold: float = FOG_UTILIZATION_THRESHOLD):
-        super().__init__(infrastructure)
+        # Taxis are only attached to a single traffic light, so their data flows are routed via the static backbone
+        super().__init__(infrastructure, shortest_path=BackboneRouting(infrastructure, (Cloud, FogNode, TrafficLight)))
         self.utilization_threshold = utilization_threshold
+        self.fog_nodes = CapacityIndex(infrastructure, FogNode)
 
-    def _processing_task_placement(self, processing_task: ProcessingTask, application: Application) -> Node:
-        result_node = None
+    def close(self):
+        super().close()
+        self.fog_nodes.close()
 
-        if FOG_DCS > 0:
-            if FOG_IDLE_SHUTDOWN:
-                highest_utilization_below_threshold = -1
-                for fog_node in self.infrastructure.nodes(type_filter=FogNode):
-                    if highest_utilization_below_threshold < fog_node.utilization() < self.utilization_threshold:
-                        highest_utilization_below_threshold = fog_node.utilization()
-                        result_node = fog_node
-            else:
-                lowest_utilization = math.inf
-                for fog_node in self.infrastructure.nodes(type_filter=FogNode):
-                    if fog_node.utilization() < lowest_utilization:
-                        lowest_utilization = fog_node.utilization()
-                        result_node = fog_node
+    def _processing_task_placement(self, processing_task: ProcessingTask, application: Application) -> Node:
+        if FOG_IDLE_SHUTDOWN:
+            # Consolidate tasks on few fog nodes, so idle ones can be shut down
+            result_node = self.fog_nodes.most_utilized_below(self.utilization_threshold)
+        else:
+            result_node = self.fog_nodes.least_utilized()
 
         if result_node is None or result_node.utilization() > self.utilization_threshold:
             result_node = self.infrastructure.nodes(type_filter=Cloud)[0]
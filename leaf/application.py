@@ -1,13 +1,16 @@
 from abc import ABC
+from itertools import chain
 from typing import List, Tuple, Type, Optional, TypeVar, Union
 
 import networkx as nx
 
 from leaf.infrastructure import Node, Link
-from leaf.power import PowerAware, PowerMeasurement
+from leaf.power import PowerAware, PowerMeasurement, power_snapshot_cache, snapshot_cached
 
 
 class Task(PowerAware):
+    __slots__ = ("id", "cu", "node")
+
     def __init__(self, cu: float):
         """Task that can be placed on a :class:`Node`.
 
@@ -30,8 +33,8 @@ class Task(PowerAware):
         """Place the task on a certain node and allocate resources."""
         if self.node is not None:
             raise ValueError(f"Cannot place {self} on {node}: It was already placed on {self.node}.")
+        node._add_task(self)
         self.node = node
-        self.node._add_task(self)
 
     def deallocate(self):
         """Detache the task from the node it is currently placed on and deallocate resources."""
@@ -40,14 +43,22 @@ class Task(PowerAware):
         self.node._remove_task(self)
         self.node = None
 
+    @snapshot_cached
     def measure_power(self) -> PowerMeasurement:
-        try:
-            return self.node.measure_power().multiply(self.cu / self.node.used_cu)
-        except ZeroDivisionError:
-            return PowerMeasurement(0, 0)
+        return PowerMeasurement(*self._measure_power_pair())
+
+    def _measure_power_pair(self) -> Tuple[float, float]:
+        """Return the task's share of the (dynamic, static) power usage of its node."""
+        if self.cu == 0:
+            return 0, 0
+        power = self.node.measure_power()
+        share = self.cu / self.node.used_cu
+        return power.dynamic * share, power.static * share
 
 
 class SourceTask(Task):
+    __slots__ = ("bound_node",)
+
     def __init__(self, cu: float = 0, bound_node: Node = None):
         """Source task of an application that is bound to a certain node, e.g. a sensor generating data.
 
@@ -64,6 +75,8 @@ class SourceTask(Task):
 
 
 class ProcessingTask(Task):
+    __slots__ = ()
+
     def __init__(self, cu: float = 0):
         """Processing task of an application that can be freely placed on the infrastructure.
 
@@ -76,6 +89,8 @@ class ProcessingTask(Task):
 
 
 class SinkTask(Task):
+    __slots__ = ("bound_node",)
+
     def __init__(self, cu: float = 0, bound_node: Node = None):
         """Sink task of an application that is bound to a certain node, e.g. a cloud server for storage.
 
@@ -90,6 +105,8 @@ class SinkTask(Task):
 
 
 class DataFlow(PowerAware):
+    __slots__ = ("bit_rate", "links")
+
     def __init__(self, bit_rate: float):
         """Data flow between two tasks of an application.
 
@@ -103,12 +120,20 @@ class DataFlow(PowerAware):
         return f"{self.__class__.__name__}(bit_rate={self.bit_rate})"
 
     def allocate(self, links: List[Link]):
-        """Place the data flow on a path of links and allocate bandwidth."""
+        """Place the data flow on a path of links and allocate bandwidth.
+
+        If the bandwidth cannot be allocated on one of the links, the data flow is removed from all previous links.
+        """
         if self.links is not None:
             raise ValueError(f"Cannot place {self} on {links}: It was already placed on path {self.links}.")
+        for i, link in enumerate(links):
+            try:
+                link._add_data_flow(self)
+            except ValueError:
+                for allocated_link in links[:i]:
+                    allocated_link._remove_data_flow(self)
+                raise
         self.links = links
-        for link in self.links:
-            link._add_data_flow(self)
 
     def deallocate(self):
         """Remove the data flow from the infrastructure and deallocate bandwidth."""
@@ -118,15 +143,28 @@ class DataFlow(PowerAware):
             link._remove_data_flow(self)
         self.links = None
 
+    @snapshot_cached
     def measure_power(self) -> PowerMeasurement:
+        return PowerMeasurement(*self._measure_power_pair())
+
+    def _measure_power_pair(self) -> Tuple[float, float]:
+        """Return the data flow's share of the (dynamic, static) power usage of its links."""
         if self.links is None:
             raise RuntimeError("Cannot measure power: DataFlow was not placed on any links.")
-        return PowerMeasurement.sum(link.measure_power().multiply(self.bit_rate / link.used_bandwidth)
-                                    for link in self.links)
+        dynamic, static = 0, 0
+        for link in self.links:
+            power = link.measure_power()
+            share = self.bit_rate / link.used_bandwidth
+            dynamic += power.dynamic * share
+            static += power.static * share
+        return dynamic, static
 
 
 class Application(PowerAware):
     """Application consisting of one or more tasks forming a directed acyclic graph (DAG)."""
+
+    __slots__ = ("graph",)
+
     _TTask = TypeVar("TTask", bound=Task)  # Generics
     _TDataFlow = TypeVar("TDataFlow", bound=DataFlow)  # Generics
     _TaskTypeFilter = Union[Type[_TTask], Tuple[Type[_TTask], ...]]
@@ -147,6 +185,7 @@ class Application(PowerAware):
                 :class:`DataFlow` with a certain `bit_rate` to the added `task`
         """
         task.id = len(self.tasks())
+        power_snapshot_cache.invalidate()
         if isinstance(task, SourceTask):
             assert not incoming_data_flows, f"Source task '{task}' cannot have incoming_data_flows"
             self.graph.add_node(task.id, data=task)
@@ -187,6 +226,9 @@ class Application(PowerAware):
         for data_flow in self.data_flows():
             data_flow.deallocate()
 
+    @snapshot_cached
     def measure_power(self) -> PowerMeasurement:
-        measurements = [t.measure_power() for t in self.tasks()] + [df.measure_power() for df in self.data_flows()]
-        return PowerMeasurement.sum(measurements)
+        tasks = (task for _, task in self.graph.nodes.data("data"))
+        data_flows = (data_flow for _, _, data_flow in self.graph.edges.data("data"))
+        return PowerMeasurement.sum_pairs(chain((task._measure_power_pair() for task in tasks),
+                                                (data_flow._measure_power_pair() for data_flow in data_flows)))
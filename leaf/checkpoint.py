@@ -0,0 +1,184 @@
+"""Checkpointing and restoring of simulations.
+
+A checkpoint contains an arbitrary object graph (e.g. the infrastructure, orchestrator, mobility models and meters of a
+scenario), the states of random number generators and all SimPy processes that are waiting for a timeout. As
+generators cannot be serialized, processes are restored via a simple protocol: The object that owns the generator
+method of a process has to implement a ``resume(env, process)`` method, which starts an equivalent process that first
+waits for `process.delay` and then continues where the original process left off. All meters in :mod:`leaf.power`
+implement this protocol.
+
+Example::
+
+    save_checkpoint("checkpoint.pkl.gz", env, state={"city": city, "meters": meters}, rngs=[RNG])
+    ...
+    env, state = load_checkpoint("checkpoint.pkl.gz", rngs=[RNG])
+    env.run(until=3600 * 24)
+
+Checkpoints should be created between calls to `env.run()`. References to the SimPy environment are replaced by the
+new environment on loading, while references to other events and processes are restored as None. Pending events that
+are not awaited by a process, such as the triggers of an :class:`~leaf.power.EnergyMeter`, are not restored.
+
+Processes that wait for anything other than a single timeout cannot be restored, and :func:`save_checkpoint` raises a
+`ValueError` instead of silently dropping them. This includes processes waiting for a condition such as
+``env.timeout(10) | other_event`` and processes waiting for an event that has not been triggered yet, e.g.
+``yield meter.power_threshold(15)``. The latter are only found if the event is reachable from `state`, which is always
+the case for the triggers of the meters contained in `state`. Processes waiting for untriggered events that are not
+part of `state` are not detected and silently dropped.
+"""
+import gzip
+import os
+import pickle
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import simpy
+from simpy.events import Condition
+
+from leaf.power import EnergyMeter
+
+_FORMAT_VERSION = 1
+
+
+class ProcessState:
+    def __init__(self, owner: Any, name: str, wake_time: float, arguments: Dict[str, Any]):
+        """State of a SimPy process that was waiting for a timeout when the checkpoint was created.
+
+        Args:
+            owner: Object whose generator method created the process
+            name: Name of the generator method
+            wake_time: Simulation time at which the process was scheduled to continue
+            arguments: Arguments the generator method was called with, excluding `self`
+        """
+        self.owner = owner
+        self.name = name
+        self.wake_time = wake_time
+        self.arguments = arguments
+        self.delay = 0.0  # Set relative to the current time when the checkpoint is loaded
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({type(self.owner).__name__}.{self.name}, wake_time={self.wake_time})"
+
+
+def save_checkpoint(path: str, env: simpy.Environment, state: Any, rngs: Sequence[np.random.Generator] = ()):
+    """Save the state of a simulation to a compressed binary file.
+
+    Args:
+        path: Path of the checkpoint file, existing files are overwritten
+        env: SimPy environment of the simulation
+        state: Object graph to be saved, usually a dict of the scenario's top-level objects
+        rngs: Random number generators whose states are saved. They must be passed to :func:`load_checkpoint` in the
+            same order.
+    """
+    processes = _pending_processes(env)
+    # Pickling can fail halfway through, so an existing checkpoint is only replaced once the new one is complete
+    tmp_path = f"{path}.tmp"
+    try:
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            pickler = _CheckpointPickler(f, env)
+            pickler.dump((_FORMAT_VERSION, env.now, [rng.bit_generator.state for rng in rngs]))
+            pickler.dump((state, processes))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, rngs: Sequence[np.random.Generator] = ()) -> Tuple[simpy.Environment, Any]:
+    """Load a checkpoint created via :func:`save_checkpoint` and resume all its processes.
+
+    Args:
+        path: Path of the checkpoint file
+        rngs: Random number generators whose states are restored in place
+
+    Returns:
+        A new SimPy environment at the time of the checkpoint and the restored state.
+    """
+    with gzip.open(path, "rb") as f:
+        env = None
+        unpickler = _CheckpointUnpickler(f, lambda: env)
+        version, now, rng_states = unpickler.load()
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format version {version}.")
+        env = simpy.Environment(initial_time=now)
+        state, processes = unpickler.load()
+    if len(rng_states) != len(rngs):
+        raise ValueError(f"Checkpoint contains {len(rng_states)} random number generators, but {len(rngs)} were given.")
+    for rng, rng_state in zip(rngs, rng_states):
+        rng.bit_generator.state = rng_state
+    # Processes are resumed in the order of their pending events, so events scheduled for the same time keep their order
+    for process in processes:
+        process.delay = process.wake_time - now
+        process.owner.resume(env, process)
+    return env, state
+
+
+def _pending_processes(env: simpy.Environment) -> List[ProcessState]:
+    processes = []
+    for time, _, _, event in sorted(env._queue, key=lambda entry: entry[:3]):
+        for process in _waiting_processes(event):
+            if not isinstance(event, simpy.Timeout) or process.target is not event:
+                raise ValueError(f"Cannot checkpoint {process}: Only processes waiting for a timeout are supported, "
+                                 f"create checkpoints between calls to env.run().")
+            generator = process._generator
+            frame_locals = generator.gi_frame.f_locals
+            owner = frame_locals.get("self")
+            if not hasattr(owner, "resume"):
+                raise ValueError(f"Cannot checkpoint {process}: {type(owner).__name__} does not implement resume().")
+            code = generator.gi_code
+            arguments = {name: frame_locals[name] for name in code.co_varnames[1:code.co_argcount]
+                         if name in frame_locals}
+            processes.append(ProcessState(owner, generator.__name__, time, arguments))
+    return processes
+
+
+def _waiting_processes(event: simpy.Event) -> List[simpy.Process]:
+    """Return all processes that wait for `event`, either directly or via a condition such as `AnyOf`."""
+    processes = []
+    for callback in event.callbacks or ():
+        owner = getattr(callback, "__self__", None)
+        if isinstance(owner, simpy.Process):
+            processes.append(owner)
+        elif isinstance(owner, Condition) and owner is not event:
+            processes.extend(_waiting_processes(owner))
+    return processes
+
+
+def _check_untriggered_event(event: simpy.Event):
+    processes = _waiting_processes(event)
+    if processes:
+        raise ValueError(f"Cannot checkpoint {processes[0]}: It waits for {event}, which has not been triggered yet "
+                         f"and cannot be restored.")
+
+
+class _CheckpointPickler(pickle.Pickler):
+    def __init__(self, file, env: simpy.Environment):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.env = env
+
+    def persistent_id(self, obj):
+        if obj is self.env:
+            return "environment"
+        if isinstance(obj, simpy.Event):
+            if not obj.triggered:
+                _check_untriggered_event(obj)
+            return "event"
+        if isinstance(obj, EnergyMeter):
+            # The meter drops its trigger events when pickled, so they have to be checked before
+            for _, event in obj._power_thresholds + obj._energy_budgets:
+                _check_untriggered_event(event)
+        if isinstance(obj, simpy.Environment):
+            raise ValueError("Cannot checkpoint objects that belong to another SimPy environment.")
+        return None
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, get_env):
+        super().__init__(file)
+        self._get_env = get_env
+
+    def persistent_load(self, pid):
+        if pid == "environment":
+            return self._get_env()
+        if pid == "event":
+            return None
+        raise pickle.UnpicklingError(f"Unsupported persistent object {pid}.")
@@ -1,13 +1,24 @@
+import copy
+import heapq
 import math
-from typing import List, Optional, Type, TypeVar, Iterator, Union, Tuple
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from itertools import chain
+from typing import List, Optional, Type, TypeVar, Union, Tuple, Callable, Dict, Hashable, Iterable, Iterator
 
 import networkx as nx
+import numpy as np
 
-from leaf.power import PowerAware, PowerMeasurement
+from leaf.power import PowerAware, PowerMeasurement, BatchPowerEvaluator, measures_power_model, \
+    power_snapshot_cache, snapshot_cached
 from leaf.mobility import Location
 
 
 class Node(PowerAware):
+    __slots__ = ("name", "cu", "used_cu", "tasks", "power_model", "_power", "_listeners", "_location",
+                 "_location_observers")
+
     def __init__(self, name: str,
                  cu: Optional[float] = None,
                  power_model: Optional["PowerModelNode"] = None,
@@ -34,20 +45,52 @@ class Node(PowerAware):
             self.cu = cu
         self.used_cu = 0
         self.tasks: List["Task"] = []
+        self._power: Optional[PowerMeasurement] = None
+        self._listeners: List[Callable[["Node"], None]] = []
 
         if power_model:
-            if cu is None and power_model.max_power is not None:
+            if cu is None and getattr(power_model, "max_power", None) is not None:
                 raise ValueError("Cannot use PowerModelNode with `max_power` on a compute node with unlimited "
                                  "processing power")
             self.power_model = power_model
             self.power_model.set_parent(self)
 
+        self._location_observers: Optional[_LocationObservers] = None
         self.location = location
 
     def __repr__(self):
         cu_repr = self.cu if self.cu is not None else "∞"
         return f"{self.__class__.__name__}('{self.name}', cu={self.used_cu}/{cu_repr})"
 
+    @property
+    def location(self) -> Optional[Location]:
+        """The (x,y) coordinates of the node."""
+        return self._location
+
+    @location.setter
+    def location(self, location: Optional[Location]):
+        self._location = location
+        self.moved()
+
+    def moved(self):
+        """Notify all location-dependent power models of connected links that the node moved.
+
+        This is called automatically when setting `location`. Subclasses that derive their location from other state,
+        e.g. a mobility model, have to call it whenever their location changes.
+        """
+        if self._location_observers:
+            for observer in list(self._location_observers):
+                observer.location_changed(self)
+
+    def _observe_location(self, observer):
+        """Register an object whose `location_changed(node)` method is called whenever the node moved.
+
+        Observers are only weakly referenced, so they do not need to unregister when being discarded.
+        """
+        if self._location_observers is None:
+            self._location_observers = _LocationObservers()
+        self._location_observers.add(observer)
+
     def utilization(self) -> float:
         """Return the current utilization of the resource in the range [0, 1]."""
         try:
@@ -72,26 +115,60 @@ class Node(PowerAware):
         self._release_cu(task.cu)
         self.tasks.remove(task)
 
+    @measures_power_model
     def measure_power(self) -> PowerMeasurement:
-        try:
-            return self.power_model.measure()
-        except AttributeError:
-            raise RuntimeError(f"{self} has no power model.")
+        """Return the current power usage of the node.
+
+        The measurement is cached and only recomputed after the allocated resources of the node changed.
+        """
+        if self._power is None:
+            try:
+                self._power = self.power_model.measure()
+            except AttributeError:
+                raise RuntimeError(f"{self} has no power model.")
+        return self._power
 
     def _reserve_cu(self, cu: float):
         new_used_cu = self.used_cu + cu
         if new_used_cu > self.cu:
             raise ValueError(f"Cannot reserve {cu} CU on compute node {self}.")
         self.used_cu = new_used_cu
+        self._invalidate_power()
 
     def _release_cu(self, cu: float):
         new_used_cu = self.used_cu - cu
         if new_used_cu < 0:
             raise ValueError(f"Cannot release {cu} CU on compute node {self}.")
         self.used_cu = new_used_cu
+        self._invalidate_power()
+
+    def subscribe(self, callback: Callable[["Node"], None]):
+        """Register a callback which is called with the node whenever its allocated compute units changed."""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[["Node"], None]):
+        """Remove a callback that was registered via :meth:`subscribe`."""
+        self._listeners.remove(callback)
+
+    def _invalidate_power(self):
+        """Discard the cached power measurement and notify all subscribers."""
+        self._power = None
+        power_snapshot_cache.invalidate()
+        for callback in self._listeners:
+            callback(self)
+
+
+class _LocationObservers(weakref.WeakSet):
+    """Weak set of location observers that can be pickled, e.g. as part of a checkpoint."""
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
 
 
 class Link(PowerAware):
+    __slots__ = ("src", "dst", "bandwidth", "latency", "used_bandwidth", "power_model", "data_flows", "_power",
+                 "_listeners")
+
     def __init__(self, src: Node, dst: Node, bandwidth: float, power_model: "PowerModelLink", latency: float = 0):
         """A network link in the infrastructure graph.
 
@@ -117,6 +194,8 @@ class Link(PowerAware):
         self.power_model = power_model
         self.power_model.set_parent(self)
         self.data_flows: List["DataFlow"] = []
+        self._power: Optional[PowerMeasurement] = None
+        self._listeners: List[Callable[["Link"], None]] = []
 
     def __repr__(self):
         latency_repr = f", latency={self.latency}" if self.latency else ""
@@ -138,23 +217,86 @@ class Link(PowerAware):
         self._release_bandwidth(data_flow.bit_rate)
         self.data_flows.remove(data_flow)
 
+    @measures_power_model
     def measure_power(self) -> PowerMeasurement:
-        try:
-            return self.power_model.measure()
-        except AttributeError:
-            raise RuntimeError(f"{self} has no power model.")
+        """Return the current power usage of the link.
+
+        The measurement is cached and only recomputed after the allocated bandwidth of the link changed.
+        """
+        if self._power is None:
+            try:
+                self._power = self.power_model.measure()
+            except AttributeError:
+                raise RuntimeError(f"{self} has no power model.")
+        return self._power
 
     def _reserve_bandwidth(self, bandwidth):
         new_used_bandwidth = self.used_bandwidth + bandwidth
         if new_used_bandwidth > self.bandwidth:
             raise ValueError(f"Cannot reserve {bandwidth} bandwidth on network link {self}.")
         self.used_bandwidth = new_used_bandwidth
+        self._invalidate_power()
 
     def _release_bandwidth(self, bandwidth):
         new_used_bandwidth = self.used_bandwidth - bandwidth
         if new_used_bandwidth < 0:
             raise ValueError(f"Cannot release {bandwidth} bandwidth on network link {self}.")
         self.used_bandwidth = new_used_bandwidth
+        self._invalidate_power()
+
+    def subscribe(self, callback: Callable[["Link"], None]):
+        """Register a callback which is called with the link whenever its allocated bandwidth changed."""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[["Link"], None]):
+        """Remove a callback that was registered via :meth:`subscribe`."""
+        self._listeners.remove(callback)
+
+    def _invalidate_power(self):
+        """Discard the cached power measurement and notify all subscribers."""
+        self._power = None
+        power_snapshot_cache.invalidate()
+        for callback in self._listeners:
+            callback(self)
+
+
+class TopologyChange:
+    def __init__(self):
+        """Nodes and links that were added to or removed from an :class:`Infrastructure`, in order.
+
+        See :meth:`Infrastructure.subscribe_topology`. The change contains the net effect of a
+        :meth:`Infrastructure.batch`: Elements that were added and removed again (or removed and added again) are
+        contained in neither list. However, a removed node may have been replaced by another node with the same name.
+        """
+        self.added_nodes: List[Node] = []
+        self.removed_nodes: List[Node] = []
+        self.added_links: List[Link] = []
+        self.removed_links: List[Link] = []
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(+{len(self.added_nodes)}/-{len(self.removed_nodes)} nodes, "
+                f"+{len(self.added_links)}/-{len(self.removed_links)} links)")
+
+    def __bool__(self):
+        return bool(self.added_nodes or self.removed_nodes or self.added_links or self.removed_links)
+
+    def _cancel_reverted(self):
+        """Drop all elements whose addition was reverted by a removal, or vice versa."""
+        self.added_nodes, self.removed_nodes = _net_changes(self.added_nodes, self.removed_nodes)
+        self.added_links, self.removed_links = _net_changes(self.added_links, self.removed_links)
+
+
+def _net_changes(added: List, removed: List) -> Tuple[List, List]:
+    if not added or not removed:
+        return added, removed
+    balance = {}  # Additions minus removals by identity, which is always -1, 0 or 1
+    for element in added:
+        balance[id(element)] = balance.get(id(element), 0) + 1
+    for element in removed:
+        balance[id(element)] = balance.get(id(element), 0) - 1
+    net_added = {id(element): element for element in added if balance[id(element)] > 0}
+    net_removed = {id(element): element for element in removed if balance[id(element)] < 0}
+    return list(net_added.values()), list(net_removed.values())
 
 
 class Infrastructure(PowerAware):
@@ -163,50 +305,751 @@ class Infrastructure(PowerAware):
     _NodeTypeFilter = Union[Type[_TNode], Tuple[Type[_TNode], ...]]
     _LinkTypeFilter = Union[Type[_TLink], Tuple[Type[_TLink], ...]]
 
-    def __init__(self):
+    def __init__(self, backend: str = "networkx"):
         """Infrastructure graph of the simulated scenario.
 
         The infrastructure is a weighted, directed multigraph where every node contains a :class:`Node` and every edge
-        between contains a :class:`Link`.
+        between contains a :class:`Link`. Nodes and links should only be added and removed via the methods of this
+        class, as it maintains derived data structures that are not updated when modifying `graph` directly.
+
+        Args:
+            backend: Data structure that stores the topology.
+                - "networkx" (default): A :class:`networkx.MultiDiGraph`, which is exposed as `graph`.
+                - "compact": Integer IDs, struct-of-arrays link attributes and CSR adjacency, which requires only a
+                  fraction of the memory and is intended for very large infrastructures. `graph` is materialized on
+                  access and must be treated as read-only, :meth:`shortest_path` does not require it.
         """
-        self.graph = nx.MultiDiGraph()
+        if backend == "networkx":
+            self._topology: _Topology = _NetworkxTopology()
+        elif backend == "compact":
+            self._topology = _CompactTopology()
+        else:
+            raise ValueError(f"Unknown infrastructure backend '{backend}'.")
+        self.backend = backend
+        self._batch_evaluator: Union[BatchPowerEvaluator, None, bool] = None  # False if batch evaluation unsupported
+        # For every class in the MRO of the contained nodes and links, the instances mapped to their insertion sequence
+        self._node_index = _TypeIndex(Node)
+        self._link_index = _TypeIndex(Link)
+        self._link_keys: Dict[Link, Hashable] = {}  # Keys of the links in the topology backend
+        self._pair_links: Dict[Tuple[str, str], Dict[Hashable, Link]] = {}  # All links between two nodes by key
+        self._pair_shortest_links: Dict[Tuple[str, str], Link] = {}  # Lowest-latency link between two nodes
+        self._sequence = 0  # Insertion sequence of the next node or link
+        self.topology_epoch = 0  # Incremented on every change, so derived data can be rebuilt lazily
+        self._topology_listeners: List[Callable[[TopologyChange], None]] = []
+        self._pending_change: Optional[TopologyChange] = None
+        self._batch_depth = 0
+
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        """The infrastructure as networkx graph with a `data` attribute on every node and edge."""
+        return self._topology.graph
 
     def node(self, node_name: str) -> Node:
         """Return a specific node by name."""
-        return self.graph.nodes[node_name]["data"]
+        return self._topology.node(node_name)
+
+    def link(self, src_name: str, dst_name: str, key: Optional[Hashable] = None) -> Link:
+        """Return a specific link by the names of its source and target node.
+
+        Args:
+            src_name: Name of the source node
+            dst_name: Name of the target node
+            key: Key of the link, as in `graph.edges[src_name, dst_name, key]`, to distinguish parallel links. If
+                None, the link with the lowest latency is returned (the one added first on ties).
+        """
+        try:
+            if key is None:
+                return self._pair_shortest_links[src_name, dst_name]
+            return self._pair_links[src_name, dst_name][key]
+        except KeyError:
+            raise KeyError(f"No link from '{src_name}' to '{dst_name}'" + ("" if key is None else f" with key {key}"))
 
-    # TODO link()
+    def has_link(self, link: Link) -> bool:
+        """Return whether a link is part of the infrastructure."""
+        return link in self._link_keys
+
+    def path_links(self, path: List[str]) -> List[Link]:
+        """Return the lowest-latency links along a path of node names, e.g. as returned by `networkx.shortest_path`."""
+        shortest_links = self._pair_shortest_links
+        try:
+            return [shortest_links[hop] for hop in zip(path, path[1:])]
+        except KeyError as e:
+            raise KeyError(f"No link from '{e.args[0][0]}' to '{e.args[0][1]}'") from None
+
+    def shortest_path(self, source: str, target: str, weight: Optional[str] = "latency") -> List[str]:
+        """Return the lowest-weight path between two nodes as list of node names, like `networkx.shortest_path`.
+
+        The path is computed on the data structures of the backend, so the compact backend does not materialize
+        `graph`. If there are several lowest-weight paths, the backends may return different ones.
+
+        Args:
+            source: Name of the source node
+            target: Name of the target node
+            weight: Attribute of :class:`Link` to use as weight, None for hop counts. On parallel links, the lowest
+                weight is used.
+
+        Raises:
+            networkx.NodeNotFound: If the source or target node does not exist
+            networkx.NetworkXNoPath: If the target cannot be reached from the source
+        """
+        return self._topology.shortest_path(source, target, weight)
+
+    def out_links(self, node_name: str) -> List[Link]:
+        """Return all links starting at a node."""
+        return self._topology.out_links(node_name)
+
+    def in_links(self, node_name: str) -> List[Link]:
+        """Return all links ending at a node."""
+        return self._topology.in_links(node_name)
 
     def add_link(self, link: Link):
         """Add a link to the infrastructure. Missing nodes will be added automatically."""
-        self.add_node(link.src)
-        self.add_node(link.dst)
-        self.graph.add_edge(link.src.name, link.dst.name, data=link, latency=link.latency)
+        self._add_node(link.src)
+        self._add_node(link.dst)
+        key = self._topology.add_link(link)
+        self._link_keys[link] = key
+        self._link_index.add(link, self._sequence)
+        self._sequence += 1
+        pair = (link.src.name, link.dst.name)
+        self._pair_links.setdefault(pair, {})[key] = link
+        shortest_link = self._pair_shortest_links.get(pair)
+        if shortest_link is None or link.latency < shortest_link.latency:
+            self._pair_shortest_links[pair] = link
+        self._topology_change().added_links.append(link)
+        self._topology_changed()
+
+    def add_links(self, links: Iterable[Link]):
+        """Add many links to the infrastructure in a single :meth:`batch`."""
+        with self.batch():
+            for link in links:
+                self.add_link(link)
 
     def add_node(self, node: Node):
         """Adds a node to the infrastructure."""
-        if node.name not in self.graph:
-            self.graph.add_node(node.name, data=node)
+        if self._add_node(node):
+            self._topology_changed()
+
+    def add_nodes(self, nodes: Iterable[Node]):
+        """Add many nodes to the infrastructure in a single :meth:`batch`."""
+        with self.batch():
+            for node in nodes:
+                self.add_node(node)
 
     def remove_node(self, node: Node):
-        """Removes a node from the infrastructure."""
-        self.graph.remove_node(node.name)
+        """Removes a node and all its incoming and outgoing links from the infrastructure."""
+        change = self._topology_change()
+        for link in self._topology.remove_node(node.name):
+            if link in self._link_keys:  # Self-loops are reported twice
+                self._unregister_link(link)
+                change.removed_links.append(link)
+        self._node_index.remove(node)
+        change.removed_nodes.append(node)
+        self._topology_changed()
+
+    def remove_nodes(self, nodes: Iterable[Node]):
+        """Remove many nodes and their links from the infrastructure in a single :meth:`batch`."""
+        with self.batch():
+            for node in nodes:
+                self.remove_node(node)
+
+    def remove_link(self, link: Link):
+        """Removes a link from the infrastructure. Its nodes remain in the infrastructure."""
+        self._topology.remove_link(link, self._link_keys[link])
+        self._unregister_link(link)
+        self._topology_change().removed_links.append(link)
+        self._topology_changed()
+
+    @contextmanager
+    def batch(self) -> Iterator["Infrastructure"]:
+        """Context manager that groups many topology changes.
+
+        All changes are visible immediately, but maintenance of derived data structures is deferred until the end of
+        the (outermost) batch: Topology subscribers are notified once with the combined :class:`TopologyChange` and
+        the compact backend rebuilds its adjacency at most once.
+
+        Example::
+
+            with infrastructure.batch():
+                for taxi in new_taxis:
+                    infrastructure.add_link(LinkWifi(taxi, closest_access_point(taxi)))
+        """
+        if self._batch_depth == 0:
+            self._topology.defer_maintenance(True)
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._topology.defer_maintenance(False)
+                self._notify_topology_listeners()
+
+    def subscribe_topology(self, callback: Callable[[TopologyChange], None]):
+        """Register a callback which is called with a :class:`TopologyChange` whenever nodes or links are added or
+        removed. Within a :meth:`batch`, the callback is called once at the end of the batch with the net change, and
+        not at all if the batch reverted all its changes. As a node can be replaced by another node with the same name,
+        subscribers that index nodes by name should apply removals before additions."""
+        self._topology_listeners.append(callback)
+
+    def unsubscribe_topology(self, callback: Callable[[TopologyChange], None]):
+        """Remove a callback that was registered via :meth:`subscribe_topology`."""
+        self._topology_listeners.remove(callback)
 
     def nodes(self, type_filter: Optional[_NodeTypeFilter] = None) -> List[_TNode]:
-        """Return all nodes in the infrastructure, optionally filtered by class."""
-        nodes: Iterator[Node] = (v for _, v in self.graph.nodes.data("data"))
-        if type_filter is not None:
-            nodes = (node for node in nodes if isinstance(node, type_filter))
-        return list(nodes)
+        """Return all nodes in the infrastructure in the order they were added, optionally filtered by class.
+
+        Nodes are indexed by class, so filtering costs O(result) instead of O(graph).
+        """
+        return self._node_index.query(Node if type_filter is None else type_filter)
 
     def links(self, type_filter: Optional[_LinkTypeFilter] = None) -> List[_TLink]:
-        """Return all links in the infrastructure, optionally filtered by class."""
-        links: Iterator[Link] = (v for _, _, v in self.graph.edges.data("data"))
-        if type_filter is not None:
-            links = (link for link in links if isinstance(link, type_filter))
-        return list(links)
+        """Return all links in the infrastructure in the order they were added, optionally filtered by class.
+
+        Links are indexed by class, so filtering costs O(result) instead of O(graph).
+        """
+        return self._link_index.query(Link if type_filter is None else type_filter)
 
+    @snapshot_cached
     def measure_power(self) -> PowerMeasurement:
+        """Return the power usage of all nodes and links.
+
+        If all nodes and links use standard power models, they are evaluated in batch, see
+        :class:`~leaf.power.BatchPowerEvaluator`.
+        """
+        if self._batch_evaluator is None:
+            entities = self.nodes() + self.links()
+            self._batch_evaluator = BatchPowerEvaluator.create(entities) or False
+        if self._batch_evaluator:
+            return self._batch_evaluator.measure()
         measurements = [node.measure_power() for node in self.nodes()] + [link.measure_power() for link in self.links()]
         return PowerMeasurement.sum(measurements)
 
+    def snapshot(self) -> "InfrastructureSnapshot":
+        """Return a copy-on-access snapshot of the infrastructure for what-if evaluations.
+
+        See :class:`InfrastructureSnapshot`.
+        """
+        return InfrastructureSnapshot(self)
+
+    def _add_node(self, node: Node) -> bool:
+        """Add a node without notifying topology subscribers. Returns False if the node already existed."""
+        if node.name in self._topology:
+            return False
+        self._topology.add_node(node)
+        self._node_index.add(node, self._sequence)
+        self._sequence += 1
+        self._topology_change().added_nodes.append(node)
+        return True
+
+    def _unregister_link(self, link: Link):
+        key = self._link_keys.pop(link)
+        self._link_index.remove(link)
+        pair = (link.src.name, link.dst.name)
+        links = self._pair_links[pair]
+        del links[key]
+        if not links:
+            del self._pair_links[pair]
+            del self._pair_shortest_links[pair]
+        elif self._pair_shortest_links[pair] is link:
+            self._pair_shortest_links[pair] = min(links.values(), key=lambda l: l.latency)
+
+    def _topology_change(self) -> TopologyChange:
+        """Return the change that is reported to the topology subscribers after the current operation or batch."""
+        if self._pending_change is None:
+            self._pending_change = TopologyChange()
+        return self._pending_change
+
+    def _topology_changed(self):
+        self.topology_epoch += 1
+        self._batch_evaluator = None
+        power_snapshot_cache.invalidate()
+        if self._batch_depth == 0:
+            self._notify_topology_listeners()
+
+    def _notify_topology_listeners(self):
+        change, self._pending_change = self._pending_change, None
+        if change is None:
+            return
+        change._cancel_reverted()
+        if change:
+            for callback in list(self._topology_listeners):
+                callback(change)
+
+
+class InfrastructureSnapshot(Infrastructure):
+    def __init__(self, infrastructure: Infrastructure):
+        """Copy-on-access view of an infrastructure for evaluating placements or policies without side effects.
+
+        The snapshot shares the topology and all indexes with the original infrastructure. Nodes and links are copied
+        the first time they are returned by :meth:`node`, :meth:`nodes`, :meth:`link`, :meth:`links` or
+        :meth:`path_links`, including their allocated resources, task and data flow lists and power models. Allocating
+        tasks and data flows on these copies does not affect the original. Hence, an orchestrator operating on a
+        snapshot can place candidate applications and score the result via :meth:`measure_power`, while any number
+        of snapshots can be evaluated independently of each other.
+
+        The topology of a snapshot cannot be modified, and a snapshot becomes invalid once the topology of the
+        original infrastructure changes. `graph` is shared and contains the original nodes and links, so it should
+        only be used for routing decisions. Tasks that were already placed on the original are not copied.
+
+        Limitations, as entities are copied lazily to keep snapshots cheap:
+
+        - A snapshot is not a point-in-time copy of allocations. Entities reflect the state of the original at the
+          time they are first accessed via the snapshot, so allocation changes on the original after creating the
+          snapshot are visible in all entities that were not accessed yet. Snapshots should be evaluated right away.
+        - :meth:`nodes` and :meth:`links` resolve the copies of all (matching) entities on every call, which costs
+          O(n) even if all of them were copied before.
+        - Tasks and data flows are not copied: Placing an application on a snapshot sets `Task.node` and
+          `DataFlow.links` of the application itself to the copied entities. Call `application.deallocate()` after
+          the evaluation before placing the application on the original infrastructure.
+
+        Args:
+            infrastructure: The infrastructure to take a snapshot of
+        """
+        super().__init__(backend=infrastructure.backend)
+        self.infrastructure = infrastructure
+        self.topology_epoch = infrastructure.topology_epoch
+        # The topology and all indexes are shared with the original and never modified via the snapshot
+        self._topology = infrastructure._topology
+        self._node_index = infrastructure._node_index
+        self._link_index = infrastructure._link_index
+        self._link_keys = infrastructure._link_keys
+        self._pair_links = infrastructure._pair_links
+        self._pair_shortest_links = infrastructure._pair_shortest_links
+        self._sequence = infrastructure._sequence
+        self._node_copies: Dict[Node, Node] = {}
+        self._link_copies: Dict[Link, Link] = {}
+
+    def node(self, node_name: str) -> Node:
+        self._check_topology()
+        return self._copy_node(self._topology.node(node_name))
+
+    def link(self, src_name: str, dst_name: str, key: Optional[Hashable] = None) -> Link:
+        self._check_topology()
+        return self._copy_link(super().link(src_name, dst_name, key))
+
+    def path_links(self, path: List[str]) -> List[Link]:
+        self._check_topology()
+        return [self._copy_link(link) for link in super().path_links(path)]
+
+    def shortest_path(self, source: str, target: str, weight: Optional[str] = "latency") -> List[str]:
+        self._check_topology()
+        return super().shortest_path(source, target, weight)
+
+    def out_links(self, node_name: str) -> List[Link]:
+        self._check_topology()
+        return [self._copy_link(link) for link in super().out_links(node_name)]
+
+    def in_links(self, node_name: str) -> List[Link]:
+        self._check_topology()
+        return [self._copy_link(link) for link in super().in_links(node_name)]
+
+    def nodes(self, type_filter=None) -> list:
+        self._check_topology()
+        return [self._copy_node(node) for node in super().nodes(type_filter)]
+
+    def links(self, type_filter=None) -> list:
+        self._check_topology()
+        return [self._copy_link(link) for link in super().links(type_filter)]
+
+    def copied_nodes(self) -> List[Node]:
+        """Return the copies of all nodes that were accessed via the snapshot."""
+        return list(self._node_copies.values())
+
+    def copied_links(self) -> List[Link]:
+        """Return the copies of all links that were accessed via the snapshot."""
+        return list(self._link_copies.values())
+
+    def measure_power(self) -> PowerMeasurement:
+        """Return the power usage of all nodes and links of the original infrastructure, where the copied nodes and
+        links are measured instead of their originals."""
+        self._check_topology()
+        power = self.infrastructure.measure_power()
+        for original, copy_ in chain(self._node_copies.items(), self._link_copies.items()):
+            power = power + copy_.measure_power() - original.measure_power()
+        return power
+
+    def add_link(self, link: Link):
+        raise RuntimeError("Cannot modify the topology of an infrastructure snapshot.")
+
+    def add_node(self, node: Node):
+        raise RuntimeError("Cannot modify the topology of an infrastructure snapshot.")
+
+    def remove_node(self, node: Node):
+        raise RuntimeError("Cannot modify the topology of an infrastructure snapshot.")
+
+    def remove_link(self, link: Link):
+        raise RuntimeError("Cannot modify the topology of an infrastructure snapshot.")
+
+    def snapshot(self) -> "InfrastructureSnapshot":
+        raise RuntimeError("Cannot take a snapshot of an infrastructure snapshot.")
+
+    def _check_topology(self):
+        if self.infrastructure.topology_epoch != self.topology_epoch:
+            raise RuntimeError("Snapshot is outdated: The topology of the original infrastructure changed.")
+
+    def _copy_node(self, node: Node) -> Node:
+        node_copy = self._node_copies.get(node)
+        if node_copy is None:
+            node_copy = copy.copy(node)
+            node_copy.tasks = list(node.tasks)
+            node_copy._listeners = []
+            node_copy._location_observers = None
+            if hasattr(node, "power_model"):
+                node_copy.power_model = copy.copy(node.power_model)
+                node_copy.power_model.set_parent(node_copy)
+            self._node_copies[node] = node_copy
+        return node_copy
+
+    def _copy_link(self, link: Link) -> Link:
+        link_copy = self._link_copies.get(link)
+        if link_copy is None:
+            link_copy = copy.copy(link)
+            link_copy.src = self._copy_node(link.src)
+            link_copy.dst = self._copy_node(link.dst)
+            link_copy.data_flows = list(link.data_flows)
+            link_copy._listeners = []
+            link_copy.power_model = copy.copy(link.power_model)
+            link_copy.power_model.set_parent(link_copy)
+            self._link_copies[link] = link_copy
+        return link_copy
+
+
+class _Topology(ABC):
+    """Storage of the nodes and links of an :class:`Infrastructure`."""
+
+    @property
+    @abstractmethod
+    def graph(self) -> nx.MultiDiGraph:
+        """The topology as networkx graph."""
+
+    @abstractmethod
+    def __contains__(self, node_name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def node(self, node_name: str) -> Node:
+        pass
+
+    @abstractmethod
+    def add_node(self, node: Node):
+        pass
+
+    @abstractmethod
+    def remove_node(self, node_name: str) -> List[Link]:
+        """Remove a node and return all its incoming and outgoing links, which are removed as well."""
+
+    @abstractmethod
+    def add_link(self, link: Link) -> Hashable:
+        """Add a link between two existing nodes and return its key."""
+
+    @abstractmethod
+    def remove_link(self, link: Link, key: Hashable):
+        pass
+
+    @abstractmethod
+    def shortest_path(self, source: str, target: str, weight: Optional[str]) -> List[str]:
+        """Return the lowest-weight path between two nodes, see :meth:`Infrastructure.shortest_path`."""
+
+    @abstractmethod
+    def out_links(self, node_name: str) -> List[Link]:
+        """Return all links starting at the node. Raises KeyError if the node does not exist."""
+
+    @abstractmethod
+    def in_links(self, node_name: str) -> List[Link]:
+        """Return all links ending at the node. Raises KeyError if the node does not exist."""
+
+    def defer_maintenance(self, defer: bool):
+        """Pause (or resume) the maintenance of derived data structures during a batch of changes."""
+
+
+class _NetworkxTopology(_Topology):
+    def __init__(self):
+        self._graph = nx.MultiDiGraph()
+
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        return self._graph
+
+    def __contains__(self, node_name: str) -> bool:
+        return node_name in self._graph
+
+    def node(self, node_name: str) -> Node:
+        return self._graph.nodes[node_name]["data"]
+
+    def add_node(self, node: Node):
+        self._graph.add_node(node.name, data=node)
+
+    def remove_node(self, node_name: str) -> List[Link]:
+        incident_edges = chain(self._graph.in_edges(node_name, data="data"),
+                               self._graph.out_edges(node_name, data="data"))
+        links = [link for _, _, link in incident_edges]
+        self._graph.remove_node(node_name)
+        return links
+
+    def add_link(self, link: Link) -> Hashable:
+        return self._graph.add_edge(link.src.name, link.dst.name, data=link, latency=link.latency)
+
+    def remove_link(self, link: Link, key: Hashable):
+        self._graph.remove_edge(link.src.name, link.dst.name, key)
+
+    def shortest_path(self, source: str, target: str, weight: Optional[str]) -> List[str]:
+        if weight is not None and weight != "latency":
+            # Only the latency is stored as edge attribute, other weights are read from the links
+            weight = _link_weight_function(weight)
+        return nx.shortest_path(self._graph, source, target, weight=weight)
+
+    def out_links(self, node_name: str) -> List[Link]:
+        return [edge["data"] for edges in self._graph.succ[node_name].values() for edge in edges.values()]
+
+    def in_links(self, node_name: str) -> List[Link]:
+        return [edge["data"] for edges in self._graph.pred[node_name].values() for edge in edges.values()]
+
+
+class _CompactTopology(_Topology):
+    """Topology with integer IDs, struct-of-arrays link attributes and CSR adjacency.
+
+    Links added since the last CSR build are kept in small per-node lists. Removed nodes and links leave holes that
+    are only reused after the next rebuild, which is triggered once the number of changes since the last build
+    exceeds a fraction of the number of links. This keeps mutations amortized O(1).
+    """
+
+    def __init__(self):
+        self._node_ids: Dict[str, int] = {}
+        self._nodes: List[Optional[Node]] = []
+        self._free_node_ids: List[int] = []
+        self._released_node_ids: List[int] = []  # Reusable after the next rebuild
+        self._links: List[Optional[Link]] = []
+        self._free_link_ids: List[int] = []
+        self._released_link_ids: List[int] = []  # Reusable after the next rebuild
+        self._link_src = np.empty(0, dtype=np.int32)
+        self._link_dst = np.empty(0, dtype=np.int32)
+        self._link_latency = np.empty(0, dtype=np.float64)
+        # CSR adjacency of all links at the last rebuild, sorted by link ID within every node
+        self._out_indptr = np.zeros(1, dtype=np.int64)
+        self._out_indices = np.empty(0, dtype=np.int32)
+        self._in_indptr = np.zeros(1, dtype=np.int64)
+        self._in_indices = np.empty(0, dtype=np.int32)
+        self._pending_out: Dict[int, List[int]] = {}
+        self._pending_in: Dict[int, List[int]] = {}
+        self._changes_since_build = 0
+        self._deferred = False
+        self._graph: Optional[nx.MultiDiGraph] = None
+
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        if self._graph is None:
+            graph = nx.MultiDiGraph()
+            graph.add_nodes_from((node.name, {"data": node}) for node in self._nodes if node is not None)
+            graph.add_edges_from((link.src.name, link.dst.name, link_id, {"data": link, "latency": link.latency})
+                                 for link_id, link in enumerate(self._links) if link is not None)
+            self._graph = graph
+        return self._graph
+
+    def __contains__(self, node_name: str) -> bool:
+        return node_name in self._node_ids
+
+    def node(self, node_name: str) -> Node:
+        return self._nodes[self._node_ids[node_name]]
+
+    def add_node(self, node: Node):
+        if self._free_node_ids:
+            node_id = self._free_node_ids.pop()
+            self._nodes[node_id] = node
+        else:
+            node_id = len(self._nodes)
+            self._nodes.append(node)
+        self._node_ids[node.name] = node_id
+        self._changed()
+
+    def remove_node(self, node_name: str) -> List[Link]:
+        node_id = self._node_ids.pop(node_name)
+        in_link_ids = self._adjacent(node_id, self._in_indptr, self._in_indices, self._pending_in)
+        out_link_ids = self._adjacent(node_id, self._out_indptr, self._out_indices, self._pending_out)
+        link_ids = list(dict.fromkeys(in_link_ids + out_link_ids))
+        links = [self._links[link_id] for link_id in link_ids]
+        for link_id in link_ids:
+            self._remove_link_id(link_id)
+        self._nodes[node_id] = None
+        self._pending_out.pop(node_id, None)
+        self._pending_in.pop(node_id, None)
+        self._released_node_ids.append(node_id)
+        self._changed()
+        return links
+
+    def add_link(self, link: Link) -> Hashable:
+        src_id, dst_id = self._node_ids[link.src.name], self._node_ids[link.dst.name]
+        if self._free_link_ids:
+            link_id = self._free_link_ids.pop()
+            self._links[link_id] = link
+        else:
+            link_id = len(self._links)
+            self._links.append(link)
+            if link_id == len(self._link_src):
+                capacity = max(16, 2 * link_id)
+                self._link_src = np.resize(self._link_src, capacity)
+                self._link_dst = np.resize(self._link_dst, capacity)
+                self._link_latency = np.resize(self._link_latency, capacity)
+        self._link_src[link_id] = src_id
+        self._link_dst[link_id] = dst_id
+        self._link_latency[link_id] = link.latency
+        self._pending_out.setdefault(src_id, []).append(link_id)
+        self._pending_in.setdefault(dst_id, []).append(link_id)
+        self._changed()
+        return link_id
+
+    def remove_link(self, link: Link, key: Hashable):
+        self._remove_link_id(key)
+        self._changed()
+
+    def shortest_path(self, source: str, target: str, weight: Optional[str]) -> List[str]:
+        """Dijkstra's algorithm on the CSR adjacency, which stops as soon as the target is reached."""
+        if source not in self._node_ids:
+            raise nx.NodeNotFound(f"Source {source} is not in G")
+        if target not in self._node_ids:
+            raise nx.NodeNotFound(f"Target {target} is not in G")
+        source_id, target_id = self._node_ids[source], self._node_ids[target]
+        links, link_dst = self._links, self._link_dst
+        distances = {source_id: 0}
+        predecessors: Dict[int, int] = {}  # Link IDs via which the nodes were reached
+        visited = set()
+        queue = [(0, 0, source_id)]  # (distance, push sequence, node ID)
+        sequence = 1
+        while queue:
+            distance, _, node_id = heapq.heappop(queue)
+            if node_id == target_id:
+                break
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+            for link_id in self._adjacent(node_id, self._out_indptr, self._out_indices, self._pending_out):
+                if weight is None:
+                    link_weight = 1
+                elif weight == "latency":
+                    link_weight = self._link_latency.item(link_id)
+                else:
+                    link_weight = getattr(links[link_id], weight)
+                dst_id = link_dst.item(link_id)
+                dst_distance = distance + link_weight
+                if dst_distance < distances.get(dst_id, math.inf):
+                    distances[dst_id] = dst_distance
+                    predecessors[dst_id] = link_id
+                    heapq.heappush(queue, (dst_distance, sequence, dst_id))
+                    sequence += 1
+        else:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        path = [target]
+        node_id = target_id
+        while node_id != source_id:
+            link_id = predecessors[node_id]
+            node_id = self._link_src.item(link_id)
+            path.append(links[link_id].src.name)
+        path.reverse()
+        return path
+
+    def out_links(self, node_name: str) -> List[Link]:
+        link_ids = self._adjacent(self._node_ids[node_name], self._out_indptr, self._out_indices, self._pending_out)
+        return [self._links[link_id] for link_id in link_ids]
+
+    def in_links(self, node_name: str) -> List[Link]:
+        link_ids = self._adjacent(self._node_ids[node_name], self._in_indptr, self._in_indices, self._pending_in)
+        return [self._links[link_id] for link_id in link_ids]
+
+    def _adjacent(self, node_id: int, indptr: np.ndarray, indices: np.ndarray,
+                  pending: Dict[int, List[int]]) -> List[int]:
+        link_ids = indices[indptr[node_id]:indptr[node_id + 1]].tolist() if node_id + 1 < len(indptr) else []
+        link_ids += pending.get(node_id, ())
+        return [link_id for link_id in link_ids if self._links[link_id] is not None]
+
+    def _remove_link_id(self, link_id: int):
+        self._links[link_id] = None
+        self._released_link_ids.append(link_id)
+
+    def defer_maintenance(self, defer: bool):
+        self._deferred = defer
+        if not defer:
+            self._maybe_build()
+
+    def _changed(self):
+        self._graph = None
+        self._changes_since_build += 1
+        if not self._deferred:
+            self._maybe_build()
+
+    def _maybe_build(self):
+        if self._changes_since_build > max(1024, len(self._links) // 4):
+            self._build()
+
+    def _build(self):
+        """Rebuild the CSR adjacency from all current links and make released IDs reusable."""
+        n_links = len(self._links)
+        alive = np.fromiter((link is not None for link in self._links), dtype=bool, count=n_links)
+        link_ids = np.flatnonzero(alive).astype(np.int32)
+        n_nodes = len(self._nodes)
+        for endpoint, attr in ((self._link_src, "_out"), (self._link_dst, "_in")):
+            endpoints = endpoint[link_ids]
+            order = np.argsort(endpoints, kind="stable")
+            indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(endpoints, minlength=n_nodes), out=indptr[1:])
+            setattr(self, f"{attr}_indptr", indptr)
+            setattr(self, f"{attr}_indices", link_ids[order])
+        self._pending_out.clear()
+        self._pending_in.clear()
+        self._free_link_ids += self._released_link_ids
+        self._released_link_ids.clear()
+        self._free_node_ids += self._released_node_ids
+        self._released_node_ids.clear()
+        self._changes_since_build = 0
+
+
+def _link_weight_function(weight: str) -> Callable[[str, str, Dict[Hashable, dict]], float]:
+    """Return a networkx weight function that reads an attribute of the (lowest-weight parallel) link."""
+    def weight_function(src_name: str, dst_name: str, edges: Dict[Hashable, dict]) -> float:
+        return min(getattr(edge["data"], weight) for edge in edges.values())
+    return weight_function
+
+
+class _TypeIndex:
+    """Instances mapped to their insertion sequence for every class in their MRO.
+
+    Base classes of `root` such as `object` are not stored separately, as they match all instances of `root`.
+    """
+
+    def __init__(self, root: type):
+        self._root = root
+        self._classes: Dict[type, Dict[object, int]] = {}
+        self._indexed_classes: Dict[type, Tuple[type, ...]] = {}  # Cache per concrete type
+
+    def add(self, entity, sequence: int):
+        for cls in self._classes_of(type(entity)):
+            self._classes.setdefault(cls, {})[entity] = sequence
+
+    def remove(self, entity):
+        for cls in self._classes_of(type(entity)):
+            instances = self._classes[cls]
+            del instances[entity]
+            if not instances:
+                del self._classes[cls]
+
+    def query(self, type_filter: Union[type, Tuple[type, ...]]) -> list:
+        if not isinstance(type_filter, tuple):
+            return list(self._instances(type_filter))
+        if len(type_filter) == 1:
+            return list(self._instances(type_filter[0]))
+        matches = {}
+        for cls in type_filter:
+            matches.update(self._instances(cls))
+        return sorted(matches, key=matches.__getitem__)
+
+    def _instances(self, cls: type) -> Dict[object, int]:
+        if cls is not self._root and issubclass(self._root, cls):
+            cls = self._root
+        return self._classes.get(cls, {})
+
+    def _classes_of(self, entity_type: type) -> Tuple[type, ...]:
+        classes = self._indexed_classes.get(entity_type)
+        if classes is None:
+            classes = tuple(cls for cls in entity_type.__mro__
+                            if cls is self._root or not issubclass(self._root, cls))
+            self._indexed_classes[entity_type] = classes
+        return classes
@@ -1,21 +1,27 @@
+import heapq
 import logging
+import math
+import random
+from itertools import chain
 from abc import ABC, abstractmethod
-from functools import partial
-from typing import Callable, List
+from typing import Callable, List, Dict, Tuple, Set, NamedTuple, Optional, Type, Union, Iterable
 
 import networkx as nx
 
-from leaf.application import ProcessingTask, Application, SourceTask, SinkTask
-from leaf.infrastructure import Infrastructure, Node
+from leaf.application import ProcessingTask, Application, SourceTask, SinkTask, DataFlow, Task
+from leaf.infrastructure import Infrastructure, Node, Link, TopologyChange
 
 ProcessingTaskPlacement = Callable[[ProcessingTask, Application, Infrastructure], Node]
 DataFlowPath = Callable[[nx.Graph, str, str], List[str]]
 
 logger = logging.getLogger(__name__)
 
+_PathKey = Tuple[str, str, Optional[str]]
+
 
 class Orchestrator(ABC):
-    def __init__(self, infrastructure: Infrastructure, shortest_path: DataFlowPath = None):
+    def __init__(self, infrastructure: Infrastructure, shortest_path: DataFlowPath = None,
+                 capacity_aware: bool = False):
         """Orchestrator which is responsible for allocating/placing application tasks on the infrastructure.
 
         Args:
@@ -23,34 +29,768 @@ class Orchestrator(ABC):
             shortest_path: A function for determining shortest/optimal paths between nodes.
                 This function is called for every data flow between nodes that have been placed on the infrastructure.
                 It takes the infrastructure graph, the source node, and target node and maps it to the list of nodes
-                on the path. Defaults to `networkx.shortest_path`. More algorithms can be found
+                on the path. Defaults to a :class:`PathCache` of the lowest-latency paths. More algorithms can be found
                 `here <https://networkx.org/documentation/stable/reference/algorithms/shortest_paths.html>`_.
+                :class:`Routing` instances are called via :meth:`Routing.path` without the graph, which is expensive to
+                materialize for the compact infrastructure backend.
+            capacity_aware: If True, data flows whose shortest path lacks the residual bandwidth for their bit rate
+                are routed via a :class:`CapacityAwareRouting` instead, which only considers links with sufficient
+                residual bandwidth. Otherwise, placing such a data flow raises a ValueError.
         """
         self.infrastructure = infrastructure
         if shortest_path is None:
-            self.shortest_path = partial(nx.shortest_path, weight="latency")
+            shortest_path = PathCache(infrastructure)
+        self.shortest_path = shortest_path
+        self.capacity_aware = capacity_aware
+        self._capacity_aware_routing: Optional[CapacityAwareRouting] = None  # Created on first use
+        self._batch_path_links: Optional[Dict[Tuple[str, str], List[Link]]] = None  # Shared within place_many()
+
+    def close(self):
+        """Stop the path functions of the orchestrator from listening to changes of the infrastructure.
+
+        Closes the :attr:`shortest_path` function if it provides a `close()` method, like :class:`PathCache`, and the
+        :class:`CapacityAwareRouting` if it was created. Call this if the orchestrator is discarded while the
+        infrastructure is still in use, as the subscriptions keep the orchestrator's caches alive otherwise.
+        """
+        close = getattr(self.shortest_path, "close", None)
+        if close is not None:
+            close()
+        if self._capacity_aware_routing is not None:
+            self._capacity_aware_routing.close()
+            self._capacity_aware_routing = None
 
     def place(self, application: Application):
-        """Place an application on the infrastructure."""
-        logger.info(f"Placing {application}:")
+        """Place an application on the infrastructure.
+
+        If any of its tasks or data flows cannot be placed, all previous allocations of the application are released
+        before the exception is raised.
+        """
+        allocated = []
+        try:
+            self._place(application, allocated)
+        except Exception:
+            for task_or_data_flow in reversed(allocated):
+                task_or_data_flow.deallocate()
+            raise
+
+    def place_many(self, applications: Iterable[Application]):
+        """Place many applications on the infrastructure in a single transaction.
+
+        The applications are placed in order, as if :meth:`place` was called for each of them, but the routes between
+        pairs of nodes are only looked up once per call. If any application cannot be placed, all applications of the
+        call are released before the exception is raised, so either all or none of them are placed.
+        """
+        allocated = []
+        self._batch_path_links = {}
+        try:
+            for application in applications:
+                self._place(application, allocated)
+        except Exception:
+            for task_or_data_flow in reversed(allocated):
+                task_or_data_flow.deallocate()
+            raise
+        finally:
+            self._batch_path_links = None
+
+    def _place(self, application: Application, allocated: List[Union[Task, DataFlow]]):
+        """Place an application and append every allocated task and data flow to `allocated`."""
+        log = logger.isEnabledFor(logging.INFO)  # Placements are frequent, so log messages are only built if needed
+        if log:
+            logger.info(f"Placing {application}:")
         for task in application.tasks():
             if isinstance(task, (SourceTask, SinkTask)):
-                node = task.bound_node
+                node = self.infrastructure.node(task.bound_node.name)  # Resolves the node's copy on snapshots
             elif isinstance(task, ProcessingTask):
                 node = self._processing_task_placement(task, application)
             else:
                 raise TypeError(f"Unknown task type {task}")
-            logger.info(f"- {task} on {node}.")
+            if log:
+                logger.info(f"- {task} on {node}.")
             task.allocate(node)
+            allocated.append(task)
 
         for src_task_id, dst_task_id, data_flow in application.graph.edges.data("data"):
             src_task = application.graph.nodes[src_task_id]["data"]
             dst_task = application.graph.nodes[dst_task_id]["data"]
-            shortest_path = self.shortest_path(self.infrastructure.graph, src_task.node.name, dst_task.node.name)
-            links = [self.infrastructure.graph.edges[a, b, 0]["data"] for a, b in nx.utils.pairwise(shortest_path)]
-            logger.info(f"- {data_flow} on {links}.")
+            links = self._route(data_flow, src_task.node, dst_task.node)
+            if log:
+                logger.info(f"- {data_flow} on {links}.")
             data_flow.allocate(links)
+            allocated.append(data_flow)
+
+    def _route(self, data_flow: DataFlow, src_node: Node, dst_node: Node) -> List[Link]:
+        """Return the links that a data flow between two nodes is placed on."""
+        links = self._path_links(src_node.name, dst_node.name)
+        if self.capacity_aware and any(link.used_bandwidth + data_flow.bit_rate > link.bandwidth for link in links):
+            if self._capacity_aware_routing is None:
+                self._capacity_aware_routing = CapacityAwareRouting(self.infrastructure)
+            links = self._capacity_aware_routing.path(src_node.name, dst_node.name, data_flow.bit_rate)
+        return links
+
+    def _path_links(self, src_name: str, dst_name: str) -> List[Link]:
+        """Return the links on the shortest path between two nodes."""
+        if self._batch_path_links is None:
+            return self.infrastructure.path_links(self._shortest_path(src_name, dst_name))
+        links = self._batch_path_links.get((src_name, dst_name))
+        if links is None:
+            shortest_path = self._shortest_path(src_name, dst_name)
+            links = self._batch_path_links[src_name, dst_name] = self.infrastructure.path_links(shortest_path)
+        return links
+
+    def _shortest_path(self, src_name: str, dst_name: str) -> List[str]:
+        if isinstance(self.shortest_path, Routing):
+            return self.shortest_path.path(src_name, dst_name)
+        return self.shortest_path(self.infrastructure.graph, src_name, dst_name)
 
     @abstractmethod
     def _processing_task_placement(self, processing_task: ProcessingTask, application: Application) -> Node:
         pass
+
+
+class PathCacheInfo(NamedTuple):
+    """Statistics of a :class:`PathCache`."""
+    hits: int
+    misses: int
+    invalidations: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Routing(ABC):
+    """Base class for :data:`DataFlowPath` functions that compute paths via the :class:`Infrastructure` itself.
+
+    The orchestrator calls :meth:`path` instead of passing the infrastructure graph, so routings that do not need the
+    graph work with all infrastructure backends without materializing it.
+    """
+
+    def __call__(self, graph: nx.Graph, source: str, target: str) -> List[str]:
+        """Return the path from `source` to `target` as list of node names, ignoring `graph`."""
+        return self.path(source, target)
+
+    @abstractmethod
+    def path(self, source: str, target: str) -> List[str]:
+        """Return the path from `source` to `target` as list of node names.
+
+        Raises:
+            networkx.NetworkXNoPath: If there is no path between the nodes
+        """
+
+
+class PathCache(Routing):
+    def __init__(self, infrastructure: Infrastructure, weight: Optional[str] = "latency",
+                 shortest_path: Optional[DataFlowPath] = None):
+        """Cache of shortest paths between nodes of an infrastructure, usable as :data:`DataFlowPath`.
+
+        Paths are computed via :meth:`Infrastructure.shortest_path` and cached per source, target and weight. The cache
+        subscribes to the topology changes of the infrastructure and only drops the paths that may no longer be
+        shortest:
+
+        - Removing a link drops all paths that traverse its source and target node consecutively.
+        - Adding a link drops all paths, unless one of its nodes has no other neighbour. Such links attach a leaf
+          (e.g. a mobile node connected to a single access point), which cannot be part of a shortest path between
+          other nodes.
+
+        Changes of the weight of existing links are not detected, call :meth:`clear` after modifying them.
+
+        Args:
+            infrastructure: The infrastructure whose paths are cached
+            weight: Attribute of :class:`Link` to use as weight, None for hop counts
+            shortest_path: Optional function that computes the paths on cache misses instead, which is called with the
+                infrastructure graph like a :data:`DataFlowPath`. It has to return shortest paths with respect to
+                `weight` for the invalidation rules to hold.
+        """
+        self.infrastructure = infrastructure
+        self.weight = weight
+        self.shortest_path = shortest_path
+        self._paths: Dict[_PathKey, List[str]] = {}
+        self._keys_by_hop: Dict[Tuple[str, str], Set[_PathKey]] = {}  # Paths without hops are indexed as (node, node)
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        infrastructure.subscribe_topology(self._topology_changed)
+
+    def path(self, source: str, target: str) -> List[str]:
+        """Return the shortest path from `source` to `target` as list of node names."""
+        key = (source, target, self.weight)
+        path = self._paths.get(key)
+        if path is not None:
+            self._hits += 1
+            return path
+        self._misses += 1
+        if self.shortest_path is None:
+            path = self.infrastructure.shortest_path(source, target, weight=self.weight)
+        else:
+            path = self.shortest_path(self.infrastructure.graph, source, target)
+        self._paths[key] = path
+        for hop in self._hops(path):
+            self._keys_by_hop.setdefault(hop, set()).add(key)
+        return path
+
+    def cache_info(self) -> PathCacheInfo:
+        """Return the number of hits, misses and invalidated paths as well as the current number of cached paths."""
+        return PathCacheInfo(self._hits, self._misses, self._invalidations, len(self._paths))
+
+    def clear(self):
+        """Drop all cached paths."""
+        self._invalidations += len(self._paths)
+        self._paths.clear()
+        self._keys_by_hop.clear()
+
+    def close(self):
+        """Drop all cached paths and stop listening to topology changes."""
+        self.clear()
+        self.infrastructure.unsubscribe_topology(self._topology_changed)
+
+    def _topology_changed(self, change: TopologyChange):
+        if not self._paths:
+            return
+        for node in change.removed_nodes:
+            self._invalidate_hop((node.name, node.name))
+        for link in change.removed_links:
+            self._invalidate_hop((link.src.name, link.dst.name))
+        if any(not self._attaches_leaf(link) for link in change.added_links):
+            self.clear()
+
+    def _attaches_leaf(self, link: Link) -> bool:
+        try:
+            for node, other in ((link.src, link.dst), (link.dst, link.src)):
+                neighbours = chain(self.infrastructure.out_links(node.name), self.infrastructure.in_links(node.name))
+                if all(neighbour_link.src is other or neighbour_link.dst is other for neighbour_link in neighbours):
+                    return True
+        except KeyError:
+            return True  # One of the nodes was removed again, so the link is not part of the topology anymore
+        return False
+
+    def _invalidate_hop(self, hop: Tuple[str, str]):
+        for key in self._keys_by_hop.pop(hop, ()):
+            path = self._paths.pop(key, None)
+            if path is None:
+                continue  # Already dropped via another hop
+            self._invalidations += 1
+            for other_hop in self._hops(path):
+                if other_hop != hop:
+                    keys = self._keys_by_hop[other_hop]
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_hop[other_hop]
+
+    @staticmethod
+    def _hops(path: List[str]) -> List[Tuple[str, str]]:
+        return list(zip(path, path[1:])) if len(path) > 1 else [(path[0], path[0])]
+
+
+class BackboneRouting(Routing):
+    def __init__(self, infrastructure: Infrastructure, backbone: Union[Type[Node], Tuple[Type[Node], ...]],
+                 weight: Optional[str] = "latency"):
+        """Routing via precomputed routes on a static backbone, usable as :data:`DataFlowPath`.
+
+        Scenarios with mobile nodes (e.g. vehicles connected to roadside units) change their topology constantly, but
+        only at the edge. This routing separates the backbone, i.e. all nodes of the given types and the links between
+        them, from the remaining nodes. Routes between backbone nodes are computed via a single-source Dijkstra search
+        per source node on first use and kept until the backbone changes. Nodes outside of the backbone that are
+        attached to a single backbone node (their access node) are routed by concatenating the access hop with the
+        precomputed backbone route, so their paths are resolved without any graph search.
+
+        Routes only traverse backbone nodes. Paths from or to other nodes that are connected to more than one node
+        are computed via :meth:`Infrastructure.shortest_path` on the complete infrastructure.
+
+        Args:
+            infrastructure: The infrastructure to route on
+            backbone: Node class or tuple of node classes that form the backbone
+            weight: Attribute of :class:`Link` to use as weight, None for hop counts. On parallel links, the lowest
+                weight is used.
+        """
+        self.infrastructure = infrastructure
+        self.backbone = backbone
+        self.weight = weight
+        self._backbone_graph: Optional[nx.DiGraph] = None
+        self._routes: Dict[str, Dict[str, List[str]]] = {}  # Routes from a backbone node to all reachable ones
+        infrastructure.subscribe_topology(self._topology_changed)
+
+    def path(self, source: str, target: str) -> List[str]:
+        """Return the path from `source` to `target` as list of node names."""
+        if source == target:
+            return [source]
+        source_access = self._access_node(source, outgoing=True)
+        target_access = self._access_node(target, outgoing=False)
+        if source_access is None or target_access is None:
+            return self.infrastructure.shortest_path(source, target, weight=self.weight)
+        route = self.route(source_access, target_access)
+        if route is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        if source != source_access:
+            route = [source] + route
+        if target != target_access:
+            route = route + [target]
+        return route
+
+    def route(self, source: str, target: str) -> Optional[List[str]]:
+        """Return the precomputed route between two backbone nodes or None if there is none."""
+        routes = self._routes.get(source)
+        if routes is None:
+            if self._backbone_graph is None:
+                self._backbone_graph = self._build_backbone_graph()
+            routes = nx.single_source_dijkstra_path(self._backbone_graph, source, weight="weight")
+            self._routes[source] = routes
+        return routes.get(target)
+
+    def close(self):
+        """Stop listening to topology changes."""
+        self.infrastructure.unsubscribe_topology(self._topology_changed)
+
+    def _access_node(self, node_name: str, outgoing: bool) -> Optional[str]:
+        """Return the node itself if it is part of the backbone, its access node if it is attached to a single
+        backbone node, or None otherwise."""
+        node = self.infrastructure.node(node_name)
+        if isinstance(node, self.backbone):
+            return node_name
+        links = self.infrastructure.out_links(node_name) if outgoing else self.infrastructure.in_links(node_name)
+        if not links:
+            raise nx.NetworkXNoPath(f"{node} has no {'outgoing' if outgoing else 'incoming'} links.")
+        access_node = links[0].dst if outgoing else links[0].src
+        if not isinstance(access_node, self.backbone):
+            return None
+        for link in chain(self.infrastructure.out_links(node_name), self.infrastructure.in_links(node_name)):
+            if link.src is not access_node and link.dst is not access_node:
+                return None
+        return access_node.name
+
+    def _build_backbone_graph(self) -> nx.DiGraph:
+        backbone_graph = nx.DiGraph()
+        for node in self.infrastructure.nodes(type_filter=self.backbone):
+            backbone_graph.add_node(node.name)
+        for node in self.infrastructure.nodes(type_filter=self.backbone):
+            for link in self.infrastructure.out_links(node.name):
+                if isinstance(link.dst, self.backbone):
+                    weight = 1 if self.weight is None else getattr(link, self.weight)
+                    edge = backbone_graph.get_edge_data(node.name, link.dst.name)
+                    if edge is None or weight < edge["weight"]:
+                        backbone_graph.add_edge(node.name, link.dst.name, weight=weight)
+        return backbone_graph
+
+    def _topology_changed(self, change: TopologyChange):
+        if self._backbone_graph is None and not self._routes:
+            return
+        backbone_changed = (any(isinstance(node, self.backbone) for node in chain(change.added_nodes,
+                                                                                  change.removed_nodes))
+                            or any(isinstance(link.src, self.backbone) and isinstance(link.dst, self.backbone)
+                                   for link in chain(change.added_links, change.removed_links)))
+        if backbone_changed:
+            self._backbone_graph = None
+            self._routes.clear()
+
+
+class CapacityAwareRouting:
+    def __init__(self, infrastructure: Infrastructure, weight: Optional[str] = "latency"):
+        """Routing of data flows via links with sufficient residual bandwidth.
+
+        Paths are computed via Dijkstra's algorithm, where all links that cannot accommodate the bit rate of the data
+        flow are pruned during the search. Hence, the result is the lowest-weight path among all paths that can
+        actually be allocated, including the choice between parallel links. The search runs on integer IDs: Adjacency
+        lists, weights, bandwidths and allocated bandwidths of all links are kept in arrays, which are updated
+        incrementally via topology and link subscriptions.
+
+        Args:
+            infrastructure: The infrastructure to route on
+            weight: Attribute of :class:`Link` to use as weight, None for hop counts
+        """
+        self.infrastructure = infrastructure
+        self.weight = weight
+        self._node_ids: Dict[str, int] = {}
+        self._free_node_ids: List[int] = []
+        self._out_links: List[List[int]] = []  # Link IDs per node ID
+        self._link_ids: Dict[Link, int] = {}
+        self._free_link_ids: List[int] = []
+        self._links: List[Optional[Link]] = []
+        self._link_dst: List[int] = []
+        self._link_weight: List[float] = []
+        self._link_bandwidth: List[float] = []
+        self._link_used_bandwidth: List[float] = []
+        for node in infrastructure.nodes():
+            self._add_node(node)
+        for link in infrastructure.links():
+            self._add_link(link)
+        infrastructure.subscribe_topology(self._topology_changed)
+
+    def path(self, source: str, target: str, bit_rate: float) -> List[Link]:
+        """Return the links of the lowest-weight path from `source` to `target` that can accommodate `bit_rate`.
+
+        Raises:
+            networkx.NetworkXNoPath: If no path has sufficient residual bandwidth
+        """
+        try:
+            source_id, target_id = self._node_ids[source], self._node_ids[target]
+        except KeyError as e:
+            raise nx.NodeNotFound(f"Node {e.args[0]} not found in the infrastructure.") from None
+        out_links, link_dst, link_weight = self._out_links, self._link_dst, self._link_weight
+        bandwidth, used_bandwidth = self._link_bandwidth, self._link_used_bandwidth
+        distances = {source_id: 0}
+        predecessors: Dict[int, int] = {}  # Link IDs via which the nodes were reached
+        visited = set()
+        queue = [(0, 0, source_id)]  # (distance, push sequence, node ID)
+        sequence = 1
+        while queue:
+            distance, _, node_id = heapq.heappop(queue)
+            if node_id == target_id:
+                break
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+            for link_id in out_links[node_id]:
+                if used_bandwidth[link_id] + bit_rate > bandwidth[link_id]:
+                    continue  # Same condition as in Link._reserve_bandwidth
+                dst_id = link_dst[link_id]
+                dst_distance = distance + link_weight[link_id]
+                if dst_distance < distances.get(dst_id, math.inf):
+                    distances[dst_id] = dst_distance
+                    predecessors[dst_id] = link_id
+                    heapq.heappush(queue, (dst_distance, sequence, dst_id))
+                    sequence += 1
+        else:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target} with {bit_rate} residual bandwidth.")
+
+        path = []
+        node_id = target_id
+        while node_id != source_id:
+            link = self._links[predecessors[node_id]]
+            path.append(link)
+            node_id = self._node_ids[link.src.name]
+        path.reverse()
+        return path
+
+    def close(self):
+        """Stop listening to topology and link changes."""
+        self.infrastructure.unsubscribe_topology(self._topology_changed)
+        for link in self._link_ids:
+            link.unsubscribe(self._link_changed)
+
+    def _topology_changed(self, change: TopologyChange):
+        # The arrays are synced with the final state of the topology. Removals are applied first, as a node may have
+        # been replaced by another node with the same name.
+        for link in change.removed_links:
+            if not self.infrastructure.has_link(link):
+                self._remove_link(link)
+        for node in change.removed_nodes:
+            if not self._contains_node(node):
+                self._remove_node(node)
+        for node in change.added_nodes:
+            if self._contains_node(node):
+                self._add_node(node)
+        for link in change.added_links:
+            if self.infrastructure.has_link(link):
+                self._add_link(link)
+
+    def _contains_node(self, node: Node) -> bool:
+        try:
+            return self.infrastructure.node(node.name) is node
+        except KeyError:
+            return False
+
+    def _link_changed(self, link: Link):
+        self._link_used_bandwidth[self._link_ids[link]] = link.used_bandwidth
+
+    def _add_node(self, node: Node):
+        if node.name in self._node_ids:
+            return
+        if self._free_node_ids:
+            node_id = self._free_node_ids.pop()
+        else:
+            node_id = len(self._out_links)
+            self._out_links.append([])
+        self._node_ids[node.name] = node_id
+
+    def _remove_node(self, node: Node):
+        node_id = self._node_ids.pop(node.name, None)
+        if node_id is not None:
+            self._out_links[node_id] = []
+            self._free_node_ids.append(node_id)
+
+    def _add_link(self, link: Link):
+        if link in self._link_ids:
+            return
+        weight = 1 if self.weight is None else getattr(link, self.weight)
+        if self._free_link_ids:
+            link_id = self._free_link_ids.pop()
+            self._links[link_id] = link
+            self._link_dst[link_id] = self._node_ids[link.dst.name]
+            self._link_weight[link_id] = weight
+            self._link_bandwidth[link_id] = link.bandwidth
+            self._link_used_bandwidth[link_id] = link.used_bandwidth
+        else:
+            link_id = len(self._links)
+            self._links.append(link)
+            self._link_dst.append(self._node_ids[link.dst.name])
+            self._link_weight.append(weight)
+            self._link_bandwidth.append(link.bandwidth)
+            self._link_used_bandwidth.append(link.used_bandwidth)
+        self._link_ids[link] = link_id
+        self._out_links[self._node_ids[link.src.name]].append(link_id)
+        link.subscribe(self._link_changed)
+
+    def _remove_link(self, link: Link):
+        link_id = self._link_ids.pop(link, None)
+        if link_id is None:
+            return
+        src_id = self._node_ids.get(link.src.name)
+        if src_id is not None:
+            self._out_links[src_id].remove(link_id)
+        self._links[link_id] = None
+        self._free_link_ids.append(link_id)
+        link.unsubscribe(self._link_changed)
+
+
+class CapacityIndex:
+    def __init__(self, infrastructure: Infrastructure, node_type: Union[Type[Node], Tuple[Type[Node], ...]] = Node):
+        """Index of the compute capacity of nodes for selecting placement candidates without scanning all nodes.
+
+        The index contains all nodes of the given types in the infrastructure and follows its topology changes. It
+        subscribes to the nodes, so it is updated automatically whenever compute units are reserved or released.
+        Nodes are kept in a treap (randomized balanced search tree) ordered by (utilization, insertion order) and in a
+        segment tree over their free compute units in insertion order. Queries and updates take O(log n).
+
+        On ties, all queries return the node that was added to the infrastructure first, like a linear scan over
+        `infrastructure.nodes(type_filter=node_type)` that only replaces its candidate on strict improvements.
+
+        Args:
+            infrastructure: The infrastructure whose nodes are indexed
+            node_type: Node class or tuple of node classes to index
+        """
+        self.infrastructure = infrastructure
+        self.node_type = node_type
+        self._slots: Dict[Node, int] = {}  # Position of every node in insertion order
+        self._nodes: List[Optional[Node]] = []  # Nodes by slot, None for removed nodes
+        self._keys = _SortedKeys()  # (utilization, slot) of all nodes
+        self._node_keys: Dict[Node, Tuple[float, int]] = {}
+        self._tree: List[float] = [-math.inf, -math.inf]  # Segment tree of free CU with the leaves at [size, 2*size)
+        self._size = 1
+        for node in infrastructure.nodes(type_filter=node_type):
+            self._add(node)
+        infrastructure.subscribe_topology(self._topology_changed)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, node: Node) -> bool:
+        return node in self._slots
+
+    def least_utilized(self) -> Optional[Node]:
+        """Return the node with the lowest utilization or None if the index is empty."""
+        key = self._keys.min()
+        return None if key is None else self._nodes[key[1]]
+
+    def most_utilized_below(self, threshold: float) -> Optional[Node]:
+        """Return the node with the highest utilization strictly below `threshold` or None if there is none."""
+        key = self._keys.lower((threshold, -1))
+        if key is None:
+            return None
+        return self._nodes[self._keys.ceiling((key[0], -1))[1]]  # The first added node with this utilization
+
+    def first_fit(self, cu: float) -> Optional[Node]:
+        """Return the first node that can accommodate `cu` additional compute units or None if there is none."""
+        slot = self._first_slot(cu, 0)
+        while slot is not None:
+            node = self._nodes[slot]
+            if node.used_cu + cu <= node.cu:  # Same condition as in Node._reserve_cu, free CU is subject to rounding
+                return node
+            slot = self._first_slot(cu, slot + 1)
+        return None
+
+    def close(self):
+        """Stop listening to topology and node changes."""
+        self.infrastructure.unsubscribe_topology(self._topology_changed)
+        for node in self._slots:
+            node.unsubscribe(self._node_changed)
+
+    def _topology_changed(self, change: TopologyChange):
+        # A removed node may have been replaced by another node with the same name, so the index is synced with the
+        # final state of the topology
+        for node in chain(change.removed_nodes, change.added_nodes):
+            if not isinstance(node, self.node_type):
+                continue
+            try:
+                contained = self.infrastructure.node(node.name) is node
+            except KeyError:
+                contained = False
+            if contained and node not in self._slots:
+                self._add(node)
+            elif not contained and node in self._slots:
+                self._remove(node)
+
+    def _add(self, node: Node):
+        if len(self._nodes) == self._size:
+            self._rebuild(max(2 * len(self._slots), 1))
+        slot = len(self._nodes)
+        self._nodes.append(node)
+        self._slots[node] = slot
+        self._insert_key(node, slot)
+        self._update_tree(slot, node.cu - node.used_cu)
+        node.subscribe(self._node_changed)
+
+    def _remove(self, node: Node):
+        slot = self._slots.pop(node)
+        self._nodes[slot] = None
+        self._keys.remove(self._node_keys.pop(node))
+        self._update_tree(slot, -math.inf)
+        node.unsubscribe(self._node_changed)
+
+    def _node_changed(self, node: Node):
+        slot = self._slots[node]
+        key = self._node_keys[node]
+        if key[0] != node.utilization():
+            self._keys.remove(key)
+            self._insert_key(node, slot)
+        self._update_tree(slot, node.cu - node.used_cu)
+
+    def _insert_key(self, node: Node, slot: int):
+        key = (node.utilization(), slot)
+        self._keys.add(key)
+        self._node_keys[node] = key
+
+    def _update_tree(self, slot: int, free_cu: float):
+        tree = self._tree
+        i = self._size + slot
+        tree[i] = free_cu
+        i //= 2
+        while i:
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+            i //= 2
+
+    def _first_slot(self, cu: float, start: int) -> Optional[int]:
+        """Return the first slot at or after `start` whose free CU are at least `cu`."""
+        tree, size = self._tree, self._size
+
+        def search(i: int, lo: int, hi: int) -> Optional[int]:
+            if hi <= start or tree[i] < cu:
+                return None
+            if i >= size:
+                return lo
+            mid = (lo + hi) // 2
+            slot = search(2 * i, lo, mid)
+            return slot if slot is not None else search(2 * i + 1, mid, hi)
+
+        return search(1, 0, size)
+
+    def _rebuild(self, capacity: int):
+        """Renumber the slots of all nodes in insertion order and resize the segment tree to fit `capacity` nodes."""
+        nodes = [node for node in self._nodes if node is not None]
+        self._size = 1
+        while self._size < capacity:
+            self._size *= 2
+        self._tree = [-math.inf] * (2 * self._size)
+        self._nodes = nodes
+        self._slots = {node: slot for slot, node in enumerate(nodes)}
+        self._node_keys = {node: (node.utilization(), slot) for slot, node in enumerate(nodes)}
+        self._keys = _SortedKeys(self._node_keys.values())
+        for slot, node in enumerate(nodes):
+            self._tree[self._size + slot] = node.cu - node.used_cu
+        for i in range(self._size - 1, 0, -1):
+            self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+
+
+class _TreapNode:
+    __slots__ = ("key", "priority", "left", "right")
+
+    def __init__(self, key, priority: float):
+        self.key = key
+        self.priority = priority
+        self.left: Optional[_TreapNode] = None
+        self.right: Optional[_TreapNode] = None
+
+
+class _SortedKeys:
+    def __init__(self, keys: Iterable = ()):
+        """Sorted set of unique, comparable keys with O(log n) updates and ordered queries, implemented as a treap.
+
+        Every key gets a random priority and the tree is a heap with respect to these priorities, which keeps it
+        balanced in expectation. The priorities are drawn from a private, seeded generator, so the shape of the tree
+        does not depend on the global random state and simulations stay reproducible.
+
+        Args:
+            keys: Initial keys
+        """
+        self._random = random.Random(0)
+        self._root: Optional[_TreapNode] = None
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        """Insert a key that is not contained yet."""
+        new = _TreapNode(key, self._random.random())
+        parent, node = None, self._root
+        while node is not None and node.priority > new.priority:
+            parent, node = node, (node.left if key < node.key else node.right)
+        new.left, new.right = self._split(node, key)
+        self._replace_child(parent, key, new)
+
+    def remove(self, key):
+        """Remove a contained key."""
+        parent, node = None, self._root
+        while node.key != key:
+            parent, node = node, (node.left if key < node.key else node.right)
+        self._replace_child(parent, key, self._merge(node.left, node.right))
+
+    def min(self):
+        """Return the smallest key or None if the set is empty."""
+        node = self._root
+        if node is None:
+            return None
+        while node.left is not None:
+            node = node.left
+        return node.key
+
+    def lower(self, key):
+        """Return the largest key strictly smaller than `key` or None if there is none."""
+        result, node = None, self._root
+        while node is not None:
+            if node.key < key:
+                result, node = node.key, node.right
+            else:
+                node = node.left
+        return result
+
+    def ceiling(self, key):
+        """Return the smallest key greater than or equal to `key` or None if there is none."""
+        result, node = None, self._root
+        while node is not None:
+            if node.key < key:
+                node = node.right
+            else:
+                result, node = node.key, node.left
+        return result
+
+    def _replace_child(self, parent: Optional[_TreapNode], key, new_child: Optional[_TreapNode]):
+        """Replace the child of `parent` on the side of `key` (the root if `parent` is None)."""
+        if parent is None:
+            self._root = new_child
+        elif key < parent.key:
+            parent.left = new_child
+        else:
+            parent.right = new_child
+
+    @classmethod
+    def _split(cls, node: Optional[_TreapNode], key) -> Tuple[Optional[_TreapNode], Optional[_TreapNode]]:
+        """Split a subtree into the keys smaller than `key` and the remaining keys."""
+        if node is None:
+            return None, None
+        if node.key < key:
+            node.right, right = cls._split(node.right, key)
+            return node, right
+        left, node.left = cls._split(node.left, key)
+        return left, node
+
+    @classmethod
+    def _merge(cls, left: Optional[_TreapNode], right: Optional[_TreapNode]) -> Optional[_TreapNode]:
+        """Merge two subtrees, where all keys of `left` are smaller than the keys of `right`."""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            left.right = cls._merge(left.right, right)
+            return left
+        right.left = cls._merge(left, right.left)
+        return right
@@ -1,9 +1,14 @@
 import logging
 import math
+import operator
+import zipfile
 from abc import ABC, abstractmethod
-from functools import reduce
-from typing import List, Union, Collection, Callable, Optional, Iterable
+from bisect import bisect_right
+from functools import wraps
+from itertools import chain
+from typing import List, Union, Collection, Callable, Optional, Iterable, Sequence, Iterator, Tuple, Dict
 
+import numpy as np
 import simpy
 
 logger = logging.getLogger(__name__)
@@ -11,6 +16,8 @@ _unnamed_power_meters_created = 0
 
 
 class PowerMeasurement:
+    __slots__ = ("dynamic", "static")
+
     def __init__(self, dynamic: float, static: float):
         """Power measurement of one or more entities at a certain point in time.
 
@@ -23,8 +30,20 @@ class PowerMeasurement:
 
     @classmethod
     def sum(cls, measurements: Iterable["PowerMeasurement"]):
-        dynamic, static = reduce(lambda acc, cur: (acc[0] + cur.dynamic, acc[1] + cur.static), measurements, (0, 0))
-        return PowerMeasurement(dynamic, static)
+        dynamic, static = 0, 0
+        for measurement in measurements:
+            dynamic += measurement.dynamic
+            static += measurement.static
+        return cls(dynamic, static)
+
+    @classmethod
+    def sum_pairs(cls, pairs: Iterable[Tuple[float, float]]):
+        """Sum up (dynamic, static) tuples without creating intermediate measurements."""
+        dynamic, static = 0, 0
+        for pair_dynamic, pair_static in pairs:
+            dynamic += pair_dynamic
+            static += pair_static
+        return cls(dynamic, static)
 
     def __repr__(self):
         return f"PowerMeasurement(dynamic={self.dynamic:.2f}W, static={self.static:.2f}W)"
@@ -56,6 +75,7 @@ class PowerMeasurement:
 
 class PowerModel(ABC):
     """Abstract base class for power models."""
+    __slots__ = ()
 
     # TODO: Validator! Only one power model per entity
 
@@ -70,8 +90,23 @@ class PowerModel(ABC):
         Should be called in the parent's `__init__()`.
         """
 
+    @classmethod
+    def batch(cls, models: Sequence["PowerModel"]) -> Optional["PowerModelBatch"]:
+        """Return a vectorized evaluator for many power models of this class or None if this is not supported."""
+        return None
+
+
+class PowerModelBatch(ABC):
+    """Abstract base class for the vectorized evaluation of many power models of the same class."""
+
+    @abstractmethod
+    def measure(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the current dynamic and static power usage of all power models in the batch."""
+
 
 class PowerModelNode(PowerModel):
+    __slots__ = ("max_power", "power_per_cu", "static_power", "node")
+
     def __init__(self, max_power: float = None, power_per_cu: float = None, static_power: float = 0):
         """Power model for compute nodes with static and dynamic power usage.
 
@@ -107,8 +142,115 @@ class PowerModelNode(PowerModel):
     def set_parent(self, parent):
         self.node = parent
 
+    @classmethod
+    def batch(cls, models: Sequence["PowerModelNode"]) -> Optional["PowerModelBatch"]:
+        if cls.measure is not PowerModelNode.measure:
+            return None
+        return _PowerModelNodeBatch(models)
+
+
+class _PowerModelNodeBatch(PowerModelBatch):
+    def __init__(self, models: Sequence[PowerModelNode]):
+        self.nodes = [model.node for model in models]
+        self.cu = np.array([node.cu for node in self.nodes], dtype=float)
+        self.uses_max_power = np.array([model.max_power is not None for model in models])
+        self.static_power = np.array([model.static_power for model in models], dtype=float)
+        max_power = np.array([model.max_power if model.max_power is not None else 0 for model in models], dtype=float)
+        self.dynamic_range = max_power - self.static_power
+        self.power_per_cu = np.array([model.power_per_cu if model.power_per_cu is not None else 0
+                                      for model in models], dtype=float)
+
+    def measure(self) -> Tuple[np.ndarray, np.ndarray]:
+        used_cu = np.fromiter((node.used_cu for node in self.nodes), dtype=float, count=len(self.nodes))
+        utilization = np.divide(used_cu, self.cu, out=np.zeros_like(used_cu), where=self.cu != 0)
+        dynamic_power = np.where(self.uses_max_power, self.dynamic_range * utilization, self.power_per_cu * used_cu)
+        return dynamic_power, self.static_power
+
+
+class PowerModelNodeTable(PowerModel):
+    __slots__ = ("utilization", "power", "static_power", "_slopes", "node")
+
+    def __init__(self, utilization: Sequence[float], power: Sequence[float]):
+        """Power model for compute nodes based on a table of power measurements at different utilization levels.
+
+        Power usage is interpolated linearly between the breakpoints, which allows modeling the non-linear power
+        curves of real servers, e.g. as published by the SPECpower benchmark. The power usage at zero utilization is
+        the static power of the node.
+
+        Example:
+            A server that uses 60 Watt when idle, 100 Watt at 50% utilization and 200 Watt under full load:
+            `PowerModelNodeTable(utilization=[0, 0.5, 1], power=[60, 100, 200])`
+
+        Args:
+            utilization: Strictly increasing utilization breakpoints, starting at 0 and ending at 1.
+            power: Power usage in Watt at each utilization breakpoint.
+        """
+        if len(utilization) != len(power) or len(utilization) < 2:
+            raise ValueError("`utilization` and `power` need to have the same length of at least two breakpoints.")
+        if utilization[0] != 0 or utilization[-1] != 1:
+            raise ValueError("`utilization` has to start at 0 and end at 1.")
+        if any(u1 >= u2 for u1, u2 in zip(utilization, utilization[1:])):
+            raise ValueError("`utilization` has to be strictly increasing.")
+        self.utilization = tuple(float(u) for u in utilization)
+        self.power = tuple(float(p) for p in power)
+        self.static_power = self.power[0]
+        self._slopes = tuple((p2 - p1) / (u2 - u1) for u1, u2, p1, p2
+                             in zip(self.utilization, self.utilization[1:], self.power, self.power[1:]))
+        self.node = None
+
+    def measure(self) -> PowerMeasurement:
+        utilization = self.node.utilization()
+        i = min(max(bisect_right(self.utilization, utilization) - 1, 0), len(self._slopes) - 1)
+        power = self.power[i] + self._slopes[i] * (utilization - self.utilization[i])
+        return PowerMeasurement(dynamic=power - self.static_power, static=self.static_power)
+
+    def set_parent(self, parent):
+        if parent.cu == math.inf:
+            raise ValueError("Cannot use PowerModelNodeTable on a compute node with unlimited processing power")
+        self.node = parent
+
+    @classmethod
+    def batch(cls, models: Sequence["PowerModelNodeTable"]) -> Optional["PowerModelBatch"]:
+        if cls.measure is not PowerModelNodeTable.measure:
+            return None
+        return _PowerModelNodeTableBatch(models)
+
+
+class _PowerModelNodeTableBatch(PowerModelBatch):
+    def __init__(self, models: Sequence[PowerModelNodeTable]):
+        """Interpolates all models that share the same utilization breakpoints in one vectorized operation."""
+        self.nodes = [model.node for model in models]
+        self.cu = np.array([node.cu for node in self.nodes], dtype=float)
+        self.static_power = np.array([model.static_power for model in models])
+        self._groups = []
+        models_by_breakpoints = {}
+        for i, model in enumerate(models):
+            models_by_breakpoints.setdefault(model.utilization, []).append(i)
+        for breakpoints, indices in models_by_breakpoints.items():
+            power = np.array([models[i].power for i in indices])
+            if (power == power[0]).all():  # All models share the same table
+                power = power[0]
+            slopes = np.diff(power) / np.diff(breakpoints)
+            self._groups.append((np.array(indices), np.array(breakpoints), power, slopes))
+
+    def measure(self) -> Tuple[np.ndarray, np.ndarray]:
+        used_cu = np.fromiter((node.used_cu for node in self.nodes), dtype=float, count=len(self.nodes))
+        utilization = np.divide(used_cu, self.cu, out=np.zeros_like(used_cu), where=self.cu != 0)
+        power = np.empty(len(self.nodes))
+        for indices, breakpoints, table, slopes in self._groups:
+            group_utilization = utilization[indices]
+            if table.ndim == 1:
+                power[indices] = np.interp(group_utilization, breakpoints, table)
+            else:
+                i = np.clip(np.searchsorted(breakpoints, group_utilization, side="right") - 1, 0, len(breakpoints) - 2)
+                rows = np.arange(len(indices))
+                power[indices] = table[rows, i] + slopes[rows, i] * (group_utilization - breakpoints[i])
+        return power - self.static_power, self.static_power
+
 
 class PowerModelLink(PowerModel):
+    __slots__ = ("energy_per_bit", "link")
+
     def __init__(self, energy_per_bit: float):
         """Power model for network links.
 
@@ -125,12 +267,36 @@ class PowerModelLink(PowerModel):
     def set_parent(self, parent):
         self.link = parent
 
+    @classmethod
+    def batch(cls, models: Sequence["PowerModelLink"]) -> Optional["PowerModelBatch"]:
+        if cls.measure is not PowerModelLink.measure:
+            return None
+        return _PowerModelLinkBatch(models)
+
+
+class _PowerModelLinkBatch(PowerModelBatch):
+    def __init__(self, models: Sequence[PowerModelLink]):
+        self.links = [model.link for model in models]
+        self.energy_per_bit = np.array([model.energy_per_bit for model in models], dtype=float)
+        self.static_power = np.zeros(len(models))
+
+    def measure(self) -> Tuple[np.ndarray, np.ndarray]:
+        used_bandwidth = np.fromiter((link.used_bandwidth for link in self.links), dtype=float, count=len(self.links))
+        return self.energy_per_bit * used_bandwidth, self.static_power
+
 
 class PowerModelLinkWirelessTx(PowerModel):
+    __slots__ = ("energy_per_bit", "amplifier_dissipation", "link", "_squared_distance", "__weakref__")
+
     def __init__(self, energy_per_bit: float, amplifier_dissipation: float):
         """Power model for transmitting on wireless network links.
 
-        TODO Explain
+        Follows the first order radio model: Transmitting a bit costs a constant amount of energy in the transmitter
+        electronics plus the energy dissipated by the amplifier, which grows with the square of the distance between
+        source and destination node. Both nodes need a `location`.
+
+        The squared distance is cached and only recomputed after one of the nodes moved, see
+        :meth:`~leaf.infrastructure.Node.moved`.
 
         Note:
             If you don't know the amplifier dissipation or distance of nodes or if you are concerned with performance,
@@ -143,15 +309,55 @@ class PowerModelLinkWirelessTx(PowerModel):
         self.energy_per_bit = energy_per_bit
         self.amplifier_dissipation = amplifier_dissipation
         self.link = None
+        self._squared_distance: Optional[float] = None
 
     def measure(self) -> PowerMeasurement:
-        distance = self.link.src.distance(self.link.dst)
-        dissipation_energy_per_bit = self.amplifier_dissipation * distance ** 2
+        dissipation_energy_per_bit = self.amplifier_dissipation * self.squared_distance()
         dynamic_power = (self.energy_per_bit + dissipation_energy_per_bit) * self.link.used_bandwidth
         return PowerMeasurement(dynamic=dynamic_power, static=0)
 
     def set_parent(self, parent):
         self.link = parent
+        self._squared_distance = None
+        parent.src._observe_location(self)
+        parent.dst._observe_location(self)
+
+    def squared_distance(self) -> float:
+        """Return the squared distance between the source and destination node of the link."""
+        if self._squared_distance is None:
+            src_location, dst_location = self.link.src.location, self.link.dst.location
+            if src_location is None or dst_location is None:
+                raise ValueError(f"Cannot compute distance of {self.link}: Source and destination need a location.")
+            dx = dst_location.x - src_location.x
+            dy = dst_location.y - src_location.y
+            self._squared_distance = dx * dx + dy * dy
+        return self._squared_distance
+
+    def location_changed(self, node):
+        """Called by the source or destination node of the link whenever it moved."""
+        self._squared_distance = None
+        self.link._invalidate_power()
+
+    @classmethod
+    def batch(cls, models: Sequence["PowerModelLinkWirelessTx"]) -> Optional["PowerModelBatch"]:
+        if cls.measure is not PowerModelLinkWirelessTx.measure:
+            return None
+        return _PowerModelLinkWirelessTxBatch(models)
+
+
+class _PowerModelLinkWirelessTxBatch(PowerModelBatch):
+    def __init__(self, models: Sequence[PowerModelLinkWirelessTx]):
+        self.models = list(models)
+        self.energy_per_bit = np.array([model.energy_per_bit for model in models], dtype=float)
+        self.amplifier_dissipation = np.array([model.amplifier_dissipation for model in models], dtype=float)
+        self.static_power = np.zeros(len(models))
+
+    def measure(self) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self.models)
+        squared_distance = np.fromiter((model.squared_distance() for model in self.models), dtype=float, count=n)
+        used_bandwidth = np.fromiter((model.link.used_bandwidth for model in self.models), dtype=float, count=n)
+        dynamic_power = (self.energy_per_bit + self.amplifier_dissipation * squared_distance) * used_bandwidth
+        return dynamic_power, self.static_power
 
 
 class PowerAware(ABC):
@@ -159,12 +365,485 @@ class PowerAware(ABC):
 
     This may be parts of the infrastructure as well as applications.
     """
+    __slots__ = ()
 
     @abstractmethod
     def measure_power(self) -> PowerMeasurement:
         """Returns the power that is currently used by the entity."""
 
 
+class PowerSnapshotCache:
+    def __init__(self):
+        """Opt-in cache that shares power measurements between all consumers within the same allocation epoch.
+
+        The allocation epoch is incremented whenever resources are allocated or released on any node or link and
+        whenever the infrastructure topology changes. As long as the epoch does not change, the power usage of all
+        entities stays the same, so e.g. all meters firing at the same time step share one evaluation per entity.
+
+        The cache is used by all `measure_power()` implementations decorated with :func:`snapshot_cached`. Enable it
+        via the module-level instance: `leaf.power.power_snapshot_cache.enabled = True`.
+        """
+        self.enabled = False
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._values_epoch = 0
+
+    def invalidate(self):
+        """Start a new allocation epoch, discarding all cached measurements."""
+        self.epoch += 1
+
+    def lookup(self, entity: PowerAware, measure_power: Callable[[PowerAware], PowerMeasurement]) -> PowerMeasurement:
+        """Return the cached measurement of the entity or measure and cache it."""
+        if self._values_epoch != self.epoch:
+            self._values.clear()
+            self._values_epoch = self.epoch
+        try:
+            measurement = self._values[entity]
+        except KeyError:
+            self.misses += 1
+            measurement = self._values[entity] = measure_power(entity)
+        else:
+            self.hits += 1
+        return measurement
+
+
+power_snapshot_cache = PowerSnapshotCache()
+
+
+def snapshot_cached(measure_power: Callable) -> Callable:
+    """Decorator for `measure_power()` implementations whose results can be shared via the
+    :class:`PowerSnapshotCache` while the allocation epoch does not change."""
+    @wraps(measure_power)
+    def wrapper(self):
+        if not power_snapshot_cache.enabled:
+            return measure_power(self)
+        return power_snapshot_cache.lookup(self, measure_power)
+    return wrapper
+
+
+def measures_power_model(measure_power: Callable) -> Callable:
+    """Decorator for `measure_power()` implementations that return the measurement of the entity's power model as is.
+
+    Only entities whose `measure_power()` is marked like this can be evaluated by a :class:`BatchPowerEvaluator`.
+    Subclasses that override `measure_power()` lose the mark and are hence measured individually.
+    """
+    measure_power.measures_power_model = True
+    return measure_power
+
+
+class BatchPowerEvaluator:
+    def __init__(self, entities: Collection[PowerAware], measure_unsupported: bool = False):
+        """Vectorized power evaluation of many entities.
+
+        Entities are grouped by the class of their power model and each group is evaluated in a single vectorized
+        call, see :meth:`PowerModel.batch`. Use :meth:`create` to check if a collection of entities is supported.
+
+        Args:
+            entities: Entities whose `measure_power()` is marked by :func:`measures_power_model` and whose power
+                model class supports batch evaluation.
+            measure_unsupported: If True, entities that do not fulfill these requirements are measured individually
+                via `measure_power()` instead of raising a ValueError.
+        """
+        self.entities = list(entities)
+        self._unsupported: List[int] = []
+        models_by_class = {}
+        measures_model = {}  # Whether `measure_power()` is based on the power model, by entity class
+        for i, entity in enumerate(self.entities):
+            entity_type = type(entity)
+            if entity_type not in measures_model:
+                measures_model[entity_type] = getattr(entity_type.measure_power, "measures_power_model", False)
+            if not measures_model[entity_type]:
+                reason = "`measure_power()` is not based on its power model"
+            elif getattr(entity, "power_model", None) is None:
+                reason = "Entity has no power model"
+            else:
+                models_by_class.setdefault(type(entity.power_model), []).append((i, entity.power_model))
+                continue
+            if not measure_unsupported:
+                raise ValueError(f"Cannot evaluate {entity} in batch: {reason}.")
+            self._unsupported.append(i)
+
+        self._batches: List[Tuple[np.ndarray, PowerModelBatch]] = []
+        for power_model_cls, indexed_models in models_by_class.items():
+            indices, models = zip(*indexed_models)
+            batch = power_model_cls.batch(models)
+            if batch is None:
+                if not measure_unsupported:
+                    raise ValueError(f"Cannot evaluate {power_model_cls.__name__} in batch.")
+                self._unsupported.extend(indices)
+            else:
+                self._batches.append((np.array(indices), batch))
+
+    @classmethod
+    def create(cls, entities: Collection[PowerAware]) -> Optional["BatchPowerEvaluator"]:
+        """Return a batch evaluator for the entities or None if they cannot be evaluated in batch."""
+        try:
+            return cls(entities)
+        except ValueError:
+            return None
+
+    def measure(self) -> PowerMeasurement:
+        """Return the combined power usage of all entities."""
+        dynamic, static = 0, 0
+        for _, batch in self._batches:
+            batch_dynamic, batch_static = batch.measure()
+            dynamic += batch_dynamic.sum()
+            static += batch_static.sum()
+        for i in self._unsupported:
+            measurement = self.entities[i].measure_power()
+            dynamic += measurement.dynamic
+            static += measurement.static
+        return PowerMeasurement(dynamic=float(dynamic), static=float(static))
+
+    def measure_each(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the dynamic and static power usage of every entity in the order they were passed."""
+        dynamic = np.empty(len(self.entities))
+        static = np.empty(len(self.entities))
+        for indices, batch in self._batches:
+            dynamic[indices], static[indices] = batch.measure()
+        for i in self._unsupported:
+            measurement = self.entities[i].measure_power()
+            dynamic[i], static[i] = measurement.dynamic, measurement.static
+        return dynamic, static
+
+
+class MeasurementBuffer:
+    def __init__(self, columns: Sequence[str], capacity: int = 1024, dtype: np.dtype = np.float64,
+                 sink: Optional["MeasurementSink"] = None):
+        """Columnar time series storage for measurements.
+
+        Timestamps and values are stored in a preallocated NumPy array that doubles its capacity whenever it is full.
+        Compared to a list of Python objects this requires only a few bytes per measurement and allows zero-copy
+        access to the recorded data.
+
+        If a sink is provided, the buffer does not grow but passes its content to the sink whenever `chunk_size` rows
+        were recorded. Hence, memory usage stays constant and only the rows since the last flush are accessible.
+
+        Args:
+            columns: Names of the value columns
+            capacity: Number of rows that are preallocated, ignored if a sink is provided
+            dtype: Data type of the stored timestamps and values
+            sink: Optional sink that the measurements are streamed to
+        """
+        self.columns = tuple(columns)
+        self.sink = sink
+        if sink is not None:
+            capacity = sink.chunk_size
+            sink.open(self.columns)
+        self._data = np.empty((len(self.columns) + 1, capacity), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(columns={self.columns}, size={self._size})"
+
+    def append(self, time: float, *values: float):
+        """Append a row of values measured at a certain time."""
+        if self._size == self._data.shape[1]:
+            if self.sink is None:
+                self._grow()
+            else:
+                self.flush()
+        self._data[0, self._size] = time
+        self._data[1:, self._size] = values
+        self._size += 1
+
+    def extend(self, times: Sequence[float], *values: Sequence[float]):
+        """Append many rows at once, given as one sequence of timestamps and one sequence per column."""
+        rows = np.vstack((times,) + values)
+        while rows.shape[1] > 0:
+            if self._size == self._data.shape[1]:
+                if self.sink is None:
+                    self._grow(self._size + rows.shape[1])
+                else:
+                    self.flush()
+            n = min(rows.shape[1], self._data.shape[1] - self._size)
+            self._data[:, self._size:self._size + n] = rows[:, :n]
+            self._size += n
+            rows = rows[:, n:]
+
+    def clear(self):
+        """Remove all rows but keep the allocated memory."""
+        self._size = 0
+
+    def flush(self):
+        """Pass all rows to the sink and remove them from the buffer. Does nothing if there is no sink."""
+        if self.sink is not None and self._size > 0:
+            self.sink.write(self._data[0, :self._size], self._data[1:, :self._size])
+            self.clear()
+
+    def close(self):
+        """Flush the remaining rows and close the sink."""
+        if self.sink is not None:
+            self.flush()
+            self.sink.close()
+
+    @property
+    def times(self) -> np.ndarray:
+        """Timestamps of all measurements (read-only view)."""
+        return self._view(0)
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of a column for all measurements (read-only view)."""
+        return self._view(self.columns.index(name) + 1)
+
+    def to_numpy(self) -> np.ndarray:
+        """Return a read-only view of shape (1 + number of columns, number of measurements), times first."""
+        data = self._data[:, :self._size]
+        data.flags.writeable = False
+        return data
+
+    def to_dataframe(self) -> "pandas.DataFrame":
+        """Return a DataFrame indexed by time that shares its memory with the buffer where possible."""
+        import pandas as pd
+        data = self._data[1:, :self._size]
+        return pd.DataFrame(data.T, index=pd.Index(self._data[0, :self._size], name="time"), columns=self.columns,
+                            copy=False)
+
+    def _view(self, row: int) -> np.ndarray:
+        view = self._data[row, :self._size]
+        view.flags.writeable = False
+        return view
+
+    def _set_last(self, *values: float):
+        self._data[1:, self._size - 1] = values
+
+    def _grow(self, min_capacity: int = 0):
+        capacity = max(2 * self._data.shape[1], 1)
+        while capacity < min_capacity:
+            capacity *= 2
+        data = np.empty((self._data.shape[0], capacity), dtype=self._data.dtype)
+        data[:, :self._size] = self._data[:, :self._size]
+        self._data = data
+
+
+class PowerSeries(MeasurementBuffer):
+    def __init__(self, capacity: int = 1024, dtype: np.dtype = np.float64, sink: Optional["MeasurementSink"] = None):
+        """Columnar time series of :class:`PowerMeasurement`.
+
+        Behaves like a sequence of :class:`PowerMeasurement` objects (slices return a new series), but stores dynamic
+        and static power in NumPy arrays which can be accessed via :attr:`dynamic` and :attr:`static` without copying.
+
+        Args:
+            capacity: Number of measurements that are preallocated
+            dtype: Data type of the stored timestamps and values
+            sink: Optional sink that the measurements are streamed to, see :class:`MeasurementBuffer`
+        """
+        super().__init__(columns=("dynamic", "static"), capacity=capacity, dtype=dtype, sink=sink)
+
+    @classmethod
+    def from_arrays(cls, times: np.ndarray, dynamic: np.ndarray, static: np.ndarray) -> "PowerSeries":
+        """Create a series from arrays of timestamps, dynamic power and static power."""
+        series = cls(capacity=max(len(times), 1))
+        series._data[:, :len(times)] = (times, dynamic, static)
+        series._size = len(times)
+        return series
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[PowerMeasurement, "PowerSeries"]:
+        if isinstance(index, slice):
+            data = self._data[:, :self._size][:, index]
+            return PowerSeries.from_arrays(data[0], data[1], data[2])
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("PowerSeries index out of range")
+        return PowerMeasurement(dynamic=float(self._data[1, index]), static=float(self._data[2, index]))
+
+    def __iter__(self) -> Iterator[PowerMeasurement]:
+        for dynamic, static in zip(self._data[1, :self._size].tolist(), self._data[2, :self._size].tolist()):
+            yield PowerMeasurement(dynamic, static)
+
+    @property
+    def dynamic(self) -> np.ndarray:
+        """Dynamic power of all measurements in Watt (read-only view)."""
+        return self._view(1)
+
+    @property
+    def static(self) -> np.ndarray:
+        """Static power of all measurements in Watt (read-only view)."""
+        return self._view(2)
+
+
+class MeasurementSink(ABC):
+    def __init__(self, chunk_size: int = 4096):
+        """Abstract base class for sinks that measurements are streamed to during the simulation.
+
+        Args:
+            chunk_size: Number of measurements that are buffered in memory before being written to the sink
+        """
+        self.chunk_size = chunk_size
+        self.columns: Tuple[str, ...] = ()
+
+    def open(self, columns: Sequence[str]):
+        """Called by the :class:`MeasurementBuffer` the sink is attached to."""
+        self.columns = tuple(columns)
+
+    @abstractmethod
+    def write(self, times: np.ndarray, values: np.ndarray):
+        """Write a chunk of measurements.
+
+        Args:
+            times: Timestamps of the measurements
+            values: Array of shape (number of columns, number of measurements)
+        """
+
+    def close(self):
+        """Called after the last chunk was written."""
+
+
+class CsvSink(MeasurementSink):
+    def __init__(self, path: str, chunk_size: int = 4096):
+        """Sink that appends all measurements to a CSV file with a `time` column followed by the value columns.
+
+        Args:
+            path: Path of the CSV file, existing files are overwritten
+            chunk_size: Number of measurements that are buffered in memory before being written to the file
+        """
+        super().__init__(chunk_size)
+        self.path = path
+        self._file = None
+
+    def open(self, columns: Sequence[str]):
+        super().open(columns)
+        self._file = open(self.path, "w", newline="")
+        self._file.write(",".join(("time",) + self.columns) + "\n")
+
+    def write(self, times: np.ndarray, values: np.ndarray):
+        rows = zip(times.tolist(), *values.tolist())
+        self._file.write("".join(",".join(map(repr, row)) + "\n" for row in rows))
+
+    def close(self):
+        self._file.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_file"] = None
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+            state["_offset"] = self._file.tell()
+        return state
+
+    def __setstate__(self, state):
+        offset = state.pop("_offset", None)
+        self.__dict__.update(state)
+        if offset is not None:
+            # Continue after the rows that were written when the checkpoint was created
+            self._file = open(self.path, "r+", newline="")
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+
+class NpzSink(MeasurementSink):
+    def __init__(self, path: str, chunk_size: int = 65536):
+        """Sink that stores all measurements in a compressed NumPy `.npz` archive.
+
+        Every chunk is stored as a separate array per column, use :meth:`load` to read the complete columns.
+
+        Args:
+            path: Path of the archive, existing files are overwritten
+            chunk_size: Number of measurements that are buffered in memory before being written to the archive
+        """
+        super().__init__(chunk_size)
+        self.path = path
+        self._archive: Optional[zipfile.ZipFile] = None
+        self._chunks_written = 0
+
+    def open(self, columns: Sequence[str]):
+        super().open(columns)
+        self._archive = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, times: np.ndarray, values: np.ndarray):
+        for column, array in zip(("time",) + self.columns, chain([times], values)):
+            with self._archive.open(f"{column}/{self._chunks_written:08d}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(array))
+        self._chunks_written += 1
+
+    def close(self):
+        self._archive.close()
+
+    def __getstate__(self):
+        reopen = self._archive is not None and self._archive.fp is not None
+        if reopen:
+            # The archive is only readable after closing it, which writes its central directory
+            self._archive.close()
+            self._archive = zipfile.ZipFile(self.path, "a", compression=zipfile.ZIP_DEFLATED)
+        state = self.__dict__.copy()
+        state["_archive"] = None
+        state["_reopen"] = reopen
+        return state
+
+    def __setstate__(self, state):
+        reopen = state.pop("_reopen", False)
+        self.__dict__.update(state)
+        if reopen:
+            # Drop chunks that were written after the checkpoint was created and continue appending
+            with zipfile.ZipFile(self.path) as archive:
+                entries = archive.infolist()
+                kept = [entry for entry in entries if int(entry.filename.rsplit("/", 1)[1][:-4]) < self._chunks_written]
+                if len(kept) < len(entries):
+                    contents = [(entry, archive.read(entry)) for entry in kept]
+            if len(kept) < len(entries):
+                with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                    for entry, content in contents:
+                        archive.writestr(entry, content)
+            self._archive = zipfile.ZipFile(self.path, "a", compression=zipfile.ZIP_DEFLATED)
+
+    @staticmethod
+    def load(path: str) -> Dict[str, np.ndarray]:
+        """Load an archive written by a :class:`NpzSink` and return the complete `time` and value columns."""
+        chunks = {}
+        with np.load(path) as archive:
+            for key in sorted(archive.files):
+                column, _ = key.rsplit("/", 1)
+                chunks.setdefault(column, []).append(archive[key])
+        return {column: np.concatenate(arrays) for column, arrays in chunks.items()}
+
+
+class AggregatingSink(MeasurementSink):
+    def __init__(self, chunk_size: int = 4096):
+        """Sink that does not store measurements but only keeps running statistics of every column.
+
+        Args:
+            chunk_size: Number of measurements that are buffered in memory before being aggregated
+        """
+        super().__init__(chunk_size)
+        self.count = 0
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.sum: Optional[np.ndarray] = None
+        self.min: Optional[np.ndarray] = None
+        self.max: Optional[np.ndarray] = None
+
+    def open(self, columns: Sequence[str]):
+        super().open(columns)
+        self.sum = np.zeros(len(self.columns))
+        self.min = np.full(len(self.columns), np.inf)
+        self.max = np.full(len(self.columns), -np.inf)
+
+    def write(self, times: np.ndarray, values: np.ndarray):
+        if self.start is None:
+            self.start = float(times[0])
+        self.end = float(times[-1])
+        self.count += len(times)
+        self.sum += values.sum(axis=1)
+        np.minimum(self.min, values.min(axis=1), out=self.min)
+        np.maximum(self.max, values.max(axis=1), out=self.max)
+
+    def mean(self) -> np.ndarray:
+        """Return the mean of every column."""
+        return self.sum / self.count
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return the count, sum, mean, min and max of every column."""
+        return {column: {"count": self.count, "sum": float(self.sum[i]), "mean": float(self.sum[i] / self.count),
+                         "min": float(self.min[i]), "max": float(self.max[i])}
+                for i, column in enumerate(self.columns)}
+
+
 class PowerMeter:
     """Power meter that stores the power of one or more entites in regular intervals.
 
@@ -174,9 +853,13 @@ class PowerMeter:
             changes during the simulation.
         name: Name of the power meter for logging and reporting
         measurement_interval: The measurement interval.
+        dtype: Data type used for storing the measurements, see :class:`PowerSeries`.
+        sink: Optional sink that the measurements are streamed to instead of keeping them in memory. Call
+            :meth:`close` at the end of the simulation to write the remaining measurements.
     """
     def __init__(self, entities: Union[PowerAware, Collection[PowerAware], Callable[[], Collection[PowerAware]]],
-                 name: Optional[str] = None, measurement_interval: Optional[float] = 1):
+                 name: Optional[str] = None, measurement_interval: Optional[float] = 1, dtype: np.dtype = np.float64,
+                 sink: Optional[MeasurementSink] = None):
         self.entities = entities
         if name is None:
             global _unnamed_power_meters_created
@@ -185,7 +868,7 @@ class PowerMeter:
         else:
             self.name = name
         self.measurement_interval = measurement_interval
-        self.measurements = []
+        self.measurements = PowerSeries(dtype=dtype, sink=sink)
 
     def run(self, env: simpy.Environment, delay: Optional[float] = 0):
         """Starts the power meter process.
@@ -200,9 +883,14 @@ class PowerMeter:
             sim
         """
         yield env.timeout(delay)
+        batch_evaluator = None
+        if isinstance(self.entities, Collection) and len(self.entities) > 1:
+            batch_evaluator = BatchPowerEvaluator.create(self.entities)
         while True:
             if isinstance(self.entities, PowerAware):
                 measurement = self.entities.measure_power()
+            elif batch_evaluator is not None:
+                measurement = batch_evaluator.measure()
             else:
                 if isinstance(self.entities, Collection):
                     entities = self.entities
@@ -211,6 +899,518 @@ class PowerMeter:
                 else:
                     raise ValueError(f"{self.name}: Unsupported type {type(self.entities)} for observable={self.entities}.")
                 measurement = PowerMeasurement.sum(entity.measure_power() for entity in entities)
-            self.measurements.append(measurement)
+            self.measurements.append(env.now, measurement.dynamic, measurement.static)
             logger.debug(f"{env.now}: {self.name}: {measurement}")
             yield env.timeout(self.measurement_interval)
+
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the metering process after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        env.process(self.run(env, delay=process.delay))
+
+    def close(self):
+        """Write all remaining measurements to the sink and close it."""
+        self.measurements.close()
+
+
+class MeterGroup:
+    """Power meter that measures many named groups of infrastructure entities in a single process.
+
+    Each node and link of the infrastructure is assigned to all groups it matches and every matched entity is measured
+    once per measurement, via a :class:`BatchPowerEvaluator` where possible. The assignment is only recomputed when the
+    topology of the infrastructure changed, so
+    selectors must only depend on the (static) properties of a node or link. The results of all groups are stored as
+    one row per measurement in :attr:`measurements`, with a static and dynamic power column for each group.
+
+    Args:
+        infrastructure: The infrastructure whose nodes and links are assigned to the groups
+        selectors: Mapping of group names to selectors. A selector is either (1) a class or tuple of classes that
+            selects all nodes and links of these classes or (2) a function that maps a node or link to the
+            :class:`PowerAware` entity to be measured for the group (usually the entity itself or an application
+            running on it) or to None if it is not part of the group.
+        name: Name of the meter group for logging and reporting
+        measurement_interval: The measurement interval.
+        sink: Optional sink that the measurements are streamed to instead of keeping them in memory. Call
+            :meth:`close` at the end of the simulation to write the remaining measurements.
+    """
+    def __init__(self, infrastructure: "Infrastructure",
+                 selectors: Dict[str, Union[type, Tuple[type, ...], Callable[[PowerAware], Optional[PowerAware]]]],
+                 name: Optional[str] = None, measurement_interval: Optional[float] = 1,
+                 sink: Optional[MeasurementSink] = None):
+        self.infrastructure = infrastructure
+        self.selectors = dict(selectors)
+        if name is None:
+            global _unnamed_power_meters_created
+            self.name = f"meter_group_{_unnamed_power_meters_created}"
+            _unnamed_power_meters_created += 1
+        else:
+            self.name = name
+        self.measurement_interval = measurement_interval
+        columns = [f"{group} {power_type}" for group in self.selectors for power_type in ("static", "dynamic")]
+        self.measurements = MeasurementBuffer(columns=columns, sink=sink)
+        self._matchers = [_selector_to_matcher(selector) for selector in self.selectors.values()]
+        self._evaluator: Optional[BatchPowerEvaluator] = None  # Measures all entities that belong to any group
+        self._memberships: Tuple[np.ndarray, np.ndarray] = (np.empty(0, dtype=int), np.empty(0, dtype=int))
+        self._targets_epoch: Optional[int] = None
+
+    def run(self, env: simpy.Environment, delay: Optional[float] = 0):
+        """Starts the meter group process.
+
+        Args:
+            env: Simpy environment (for timing the measurements)
+            delay: The delay after which the measurements shall be conducted.
+        """
+        yield env.timeout(delay)
+        while True:
+            if self._targets_epoch != self.infrastructure.topology_epoch:
+                self._update_targets()
+            row = self._measure()
+            self.measurements.append(env.now, *row)
+            logger.debug(f"{env.now}: {self.name}: {dict(zip(self.measurements.columns, row.tolist()))}")
+            yield env.timeout(self.measurement_interval)
+
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the metering process after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        env.process(self.run(env, delay=process.delay))
+
+    def close(self):
+        """Write all remaining measurements to the sink and close it."""
+        self.measurements.close()
+
+    def series(self, group: str) -> PowerSeries:
+        """Return the measurements of a single group."""
+        return PowerSeries.from_arrays(self.measurements.times,
+                                       self.measurements.column(f"{group} dynamic"),
+                                       self.measurements.column(f"{group} static"))
+
+    def _measure(self) -> np.ndarray:
+        """Return the static and dynamic power of all groups, interleaved in the order of the columns."""
+        row = np.zeros(len(self.measurements.columns))
+        if self._evaluator is not None:
+            dynamic, static = self._evaluator.measure_each()
+            target_indices, group_indices = self._memberships
+            n_groups = len(self.selectors)
+            row[0::2] = np.bincount(group_indices, weights=static[target_indices], minlength=n_groups)
+            row[1::2] = np.bincount(group_indices, weights=dynamic[target_indices], minlength=n_groups)
+        return row
+
+    def _update_targets(self):
+        """Assign all nodes and links of the infrastructure to the groups they match."""
+        targets: List[PowerAware] = []
+        target_indices: Dict[int, int] = {}  # Keyed by id(), as entities need not be hashable
+        memberships = set()
+        entities = None
+        for i, matcher in enumerate(self._matchers):
+            if isinstance(matcher, _TypeMatcher):
+                # Nodes and links are indexed by class, so only the matching ones are visited
+                type_filter = matcher.type_filter
+                candidates = chain(self.infrastructure.nodes(type_filter), self.infrastructure.links(type_filter))
+            else:
+                if entities is None:
+                    entities = self.infrastructure.nodes() + self.infrastructure.links()
+                candidates = (matcher(entity) for entity in entities)
+            for target in candidates:
+                if target is None:
+                    continue
+                target_index = target_indices.get(id(target))
+                if target_index is None:
+                    target_index = target_indices[id(target)] = len(targets)
+                    targets.append(target)
+                memberships.add((target_index, i))  # Every target is only counted once per group
+        self._evaluator = BatchPowerEvaluator(targets, measure_unsupported=True) if targets else None
+        memberships = np.array(list(memberships), dtype=int).reshape(-1, 2)
+        self._memberships = (memberships[:, 0], memberships[:, 1])
+        self._targets_epoch = self.infrastructure.topology_epoch
+
+
+def _selector_to_matcher(selector) -> Callable[[PowerAware], Optional[PowerAware]]:
+    if isinstance(selector, (type, tuple)):
+        return _TypeMatcher(selector)
+    elif callable(selector):
+        return selector
+    raise ValueError(f"Unsupported selector {selector}.")
+
+
+class _TypeMatcher:
+    """Matches entities by class. A class instead of a closure, so meter groups can be pickled."""
+
+    def __init__(self, type_filter: Union[type, Tuple[type, ...]]):
+        self.type_filter = type_filter
+
+    def __call__(self, entity: PowerAware) -> Optional[PowerAware]:
+        return entity if isinstance(entity, self.type_filter) else None
+
+
+class EntityPowerMeter:
+    """Power meter that stores the power of every individual entity in regular intervals.
+
+    The measurements form a sparse entities × time matrix: only entities that exist at a certain time are recorded,
+    so entities can appear and disappear during the simulation, like mobile nodes. Entities that cannot be measured,
+    like nodes without power model, are skipped.
+
+    Args:
+        entities: Can be either (1) a list of :class:`PowerAware` entities or (2) a function which returns a list of
+            :class:`PowerAware` entities, if these entities change during the simulation.
+        key: Function that maps an entity to its unique ID. Defaults to the `name` attribute of the entity.
+        name: Name of the power meter for logging and reporting
+        measurement_interval: The measurement interval.
+        sink: Optional sink that the measurements (`entity` column holding the index into :attr:`entity_ids`) are
+            streamed to. The rollups and :meth:`series` only cover the measurements since the last flush in this case.
+            Call :meth:`close` at the end of the simulation to write the remaining measurements.
+    """
+    def __init__(self, entities: Union[Collection[PowerAware], Callable[[], Collection[PowerAware]]],
+                 key: Optional[Callable[[PowerAware], str]] = None, name: Optional[str] = None,
+                 measurement_interval: Optional[float] = 1, sink: Optional[MeasurementSink] = None):
+        self.entities = entities
+        self.key = key if key is not None else operator.attrgetter("name")  # Not a lambda, so it can be pickled
+        if name is None:
+            global _unnamed_power_meters_created
+            self.name = f"entity_power_meter_{_unnamed_power_meters_created}"
+            _unnamed_power_meters_created += 1
+        else:
+            self.name = name
+        self.measurement_interval = measurement_interval
+        self.entity_ids: List[str] = []
+        self.entity_types: List[str] = []
+        self.measurements = MeasurementBuffer(columns=("entity", "dynamic", "static"), sink=sink)
+        self._entity_indices: Dict[str, int] = {}
+
+    def run(self, env: simpy.Environment, delay: Optional[float] = 0):
+        """Starts the power meter process.
+
+        Args:
+            env: Simpy environment (for timing the measurements)
+            delay: The delay after which the measurements shall be conducted.
+        """
+        yield env.timeout(delay)
+        while True:
+            self.record(env.now)
+            yield env.timeout(self.measurement_interval)
+
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the metering process after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        env.process(self.run(env, delay=process.delay))
+
+    def close(self):
+        """Write all remaining measurements to the sink and close it."""
+        self.measurements.close()
+
+    def record(self, time: float):
+        """Measure all entities and store the results for the given time."""
+        entities = self.entities() if callable(self.entities) else self.entities
+        indices, dynamic, static = [], [], []
+        for entity in entities:
+            try:
+                measurement = entity.measure_power()
+            except RuntimeError:
+                continue
+            indices.append(self._entity_index(entity))
+            dynamic.append(measurement.dynamic)
+            static.append(measurement.static)
+        self.measurements.extend([time] * len(indices), indices, dynamic, static)
+
+    def energy_per_entity(self) -> "pandas.DataFrame":
+        """Return the dynamic and static energy consumed by every entity in Joule (Ws), indexed by entity ID."""
+        import pandas as pd
+        dynamic, static = self._rollup(self.measurements.column("entity").astype(int), len(self.entity_ids))
+        return pd.DataFrame({"type": self.entity_types, "dynamic": dynamic, "static": static},
+                            index=pd.Index(self.entity_ids, name="id"))
+
+    def energy_per_type(self) -> "pandas.DataFrame":
+        """Return the dynamic and static energy consumed by all entities of a type in Joule (Ws), indexed by type."""
+        import pandas as pd
+        types, type_indices = np.unique(self.entity_types, return_inverse=True)
+        entity_type_indices = type_indices[self.measurements.column("entity").astype(int)]
+        dynamic, static = self._rollup(entity_type_indices, len(types))
+        return pd.DataFrame({"dynamic": dynamic, "static": static}, index=pd.Index(types, name="type"))
+
+    def series(self, entity_id: str) -> PowerSeries:
+        """Return all measurements of a single entity."""
+        mask = self.measurements.column("entity") == self._entity_indices[entity_id]
+        return PowerSeries.from_arrays(self.measurements.times[mask],
+                                       self.measurements.column("dynamic")[mask],
+                                       self.measurements.column("static")[mask])
+
+    def to_dataframe(self) -> "pandas.DataFrame":
+        """Return all measurements in long format with the columns `time`, `id`, `type`, `dynamic` and `static`."""
+        import pandas as pd
+        entity_indices = self.measurements.column("entity").astype(int)
+        return pd.DataFrame({
+            "time": self.measurements.times,
+            "id": pd.Categorical.from_codes(entity_indices, categories=self.entity_ids),
+            "type": np.asarray(self.entity_types, dtype=object)[entity_indices],
+            "dynamic": self.measurements.column("dynamic"),
+            "static": self.measurements.column("static"),
+        })
+
+    def _entity_index(self, entity: PowerAware) -> int:
+        entity_id = self.key(entity)
+        try:
+            return self._entity_indices[entity_id]
+        except KeyError:
+            index = self._entity_indices[entity_id] = len(self.entity_ids)
+            self.entity_ids.append(entity_id)
+            self.entity_types.append(type(entity).__name__)
+            return index
+
+    def _rollup(self, group_indices: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+        dynamic = np.bincount(group_indices, weights=self.measurements.column("dynamic"), minlength=n_groups)
+        static = np.bincount(group_indices, weights=self.measurements.column("static"), minlength=n_groups)
+        return dynamic * self.measurement_interval, static * self.measurement_interval
+
+
+class EnergyMeter:
+    """Event-driven energy meter that integrates the energy consumption of one or more entities exactly.
+
+    Unlike the :class:`PowerMeter`, the energy meter does not sample the power usage in regular intervals. It subscribes
+    to the allocation changes of the metered entities and integrates their (piecewise constant) power usage between
+    these changes. Hence, idle periods do not cause any simulation events and the resulting energy is exact.
+
+    Args:
+        entities: Can be either (1) a single :class:`PowerAware` entity or (2) a list of :class:`PowerAware` entities.
+            All entities have to support subscriptions to their state changes, like
+            :class:`~leaf.infrastructure.Node` and :class:`~leaf.infrastructure.Link`.
+        name: Name of the energy meter for logging and reporting
+        sink: Optional sink that the power :attr:`changes` are streamed to. The :meth:`energy` and triggers are not
+            affected, but :meth:`measurements` only covers the changes since the last flush in this case. Call
+            :meth:`close` at the end of the simulation to write the remaining changes.
+        env: Simpy environment the meter will be started in. Only required to register triggers via
+            :meth:`power_threshold` and :meth:`energy_budget` before the meter was started.
+    """
+    def __init__(self, entities: Union[PowerAware, Collection[PowerAware]], name: Optional[str] = None,
+                 sink: Optional[MeasurementSink] = None, env: Optional[simpy.Environment] = None):
+        if isinstance(entities, PowerAware):
+            entities = [entities]
+        elif not isinstance(entities, Collection):
+            raise ValueError(f"Unsupported type {type(entities)} for entities={entities}.")
+        for entity in entities:
+            if not hasattr(entity, "subscribe"):
+                raise ValueError(f"Cannot meter {entity}: Entity does not support subscriptions to state changes.")
+        self.entities = entities
+        if name is None:
+            global _unnamed_power_meters_created
+            self.name = f"energy_meter_{_unnamed_power_meters_created}"
+            _unnamed_power_meters_created += 1
+        else:
+            self.name = name
+        self.env = env
+        self.power = PowerMeasurement(0, 0)
+        self.changes = PowerSeries(sink=sink)  # Power usage after every change, valid until the next change
+        self._last_change: Optional[float] = None  # Time of the last change, also known if `changes` were flushed
+        self._end: Optional[float] = None
+        self._entity_power = {}
+        self._updates_until_resync = 0  # Incremental power updates until the power is summed up again
+        self._energy = PowerMeasurement(0, 0)  # Energy consumed until the last change
+        self._power_thresholds: List[Tuple[float, simpy.Event]] = []
+        self._energy_budgets: List[Tuple[float, simpy.Event]] = []
+        self._budget_deadline: Optional[float] = None  # Time at which the smallest energy budget is used up
+        self._budget_wakeup: Optional[float] = None  # Time of the earliest pending timeout for the energy budgets
+
+    def run(self, env: simpy.Environment, delay: Optional[float] = 0):
+        """Starts the energy meter.
+
+        The process terminates right after subscribing to all entities; afterwards, the meter is only updated when the
+        power usage of one of its entities changes.
+
+        Args:
+            env: Simpy environment (for timing the measurements)
+            delay: The delay after which the metering shall start.
+        """
+        yield env.timeout(delay)
+        self.env = env
+        for entity in self.entities:
+            self._entity_power[entity] = entity.measure_power()
+            entity.subscribe(self._on_change)
+        self._resync_power()
+        self._record()
+        # Triggers may have been registered before the meter was started
+        if self._power_thresholds:
+            self._check_power_thresholds()
+        if self._energy_budgets:
+            self._schedule_energy_budgets()
+
+    def resume(self, env: simpy.Environment, process: "ProcessState"):
+        """Restart the metering process after loading a checkpoint, see :mod:`leaf.checkpoint`."""
+        env.process(self.run(env, delay=process.delay))
+
+    def stop(self):
+        """Stops the metering by unsubscribing from all entities.
+
+        Pending triggers returned by :meth:`power_threshold` and :meth:`energy_budget` will not fire anymore.
+        """
+        for entity in self.entities:
+            entity.unsubscribe(self._on_change)
+        self._end = self.env.now
+        self._budget_deadline = None
+        self._power_thresholds.clear()
+        self._energy_budgets.clear()
+
+    def close(self):
+        """Write all remaining power changes to the sink and close it."""
+        self.changes.close()
+
+    def energy(self) -> PowerMeasurement:
+        """Return the total energy consumed since the meter was started in Joule (Ws)."""
+        if self._last_change is None:
+            return PowerMeasurement(0, 0)
+        return self._energy + self.power.multiply(self._now() - self._last_change)
+
+    def power_threshold(self, watts: float) -> simpy.Event:
+        """Return an event that is triggered as soon as the total power usage of the entities exceeds `watts`.
+
+        The threshold is only checked when the power usage changes, so no polling process is required. The event's
+        value is the :class:`PowerMeasurement` that exceeded the threshold.
+
+        Args:
+            watts: Power threshold in Watt
+        """
+        event = self._trigger_event()
+        if float(self.power) > watts:
+            event.succeed(self.power)
+        else:
+            self._power_thresholds.append((watts, event))
+        return event
+
+    def energy_budget(self, joule: float) -> simpy.Event:
+        """Return an event that is triggered as soon as the total energy consumption of the entities exceeds `joule`.
+
+        As the power usage is constant between two changes, the time at which the budget is used up is computed
+        analytically from the current power usage. The event is scheduled for exactly this time and only rescheduled if
+        the power usage changes in between. The event's value is the consumed :meth:`energy`.
+
+        Args:
+            joule: Energy budget in Joule (Ws), counted from the start of the meter
+        """
+        event = self._trigger_event()
+        self._energy_budgets.append((joule, event))
+        self._schedule_energy_budgets()
+        return event
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Pending trigger events cannot be restored from a checkpoint
+        state["_power_thresholds"] = []
+        state["_energy_budgets"] = []
+        state["_budget_deadline"] = None
+        state["_budget_wakeup"] = None
+        return state
+
+    def _trigger_event(self) -> simpy.Event:
+        if self.env is None:
+            raise RuntimeError(f"{self.name} has to be started or created with `env` before registering triggers.")
+        if self._end is not None:
+            raise RuntimeError(f"{self.name} has already been stopped.")
+        return self.env.event()
+
+    def _check_power_thresholds(self):
+        total_power = float(self.power)
+        pending = []
+        for watts, event in self._power_thresholds:
+            if total_power > watts:
+                event.succeed(self.power)
+            else:
+                pending.append((watts, event))
+        self._power_thresholds = pending
+
+    def _schedule_energy_budgets(self):
+        """Trigger all used up energy budgets and make sure a timeout is pending for the next one.
+
+        SimPy cannot cancel timeouts, so a new timeout is only scheduled if the next budget is used up earlier than the
+        pending one fires. A timeout that fires before the budget is used up only reschedules the energy budgets.
+        """
+        energy = float(self.energy())
+        total_power = float(self.power)
+        pending = []
+        for joule, event in self._energy_budgets:
+            if energy >= joule:
+                event.succeed(self.energy())
+            else:
+                pending.append((joule, event))
+        self._energy_budgets = pending
+        if not pending or total_power <= 0 or self._end is not None:
+            self._budget_deadline = None
+            return
+        delay = (min(joule for joule, _ in pending) - energy) / total_power
+        self._budget_deadline = self.env.now + delay
+        if self._budget_wakeup is None or self._budget_wakeup > self._budget_deadline:
+            self._budget_wakeup = self._budget_deadline
+            self.env.timeout(delay).callbacks.append(self._on_budget_timeout)
+
+    def _on_budget_timeout(self, _: simpy.Event):
+        if self._budget_wakeup == self.env.now:
+            self._budget_wakeup = None
+        elif self._budget_wakeup is not None:
+            return  # Superseded by an earlier timeout
+        if self._budget_deadline is None:
+            return
+        if self._budget_deadline == self.env.now:
+            # Avoid rounding errors: the budget is used up exactly now, even if energy() is slightly below it
+            next_joule = min(joule for joule, _ in self._energy_budgets)
+            energy = self.energy()
+            pending = []
+            for joule, event in self._energy_budgets:
+                if joule == next_joule:
+                    event.succeed(energy)
+                else:
+                    pending.append((joule, event))
+            self._energy_budgets = pending
+        self._schedule_energy_budgets()
+
+    def measurements(self, interval: float = 1) -> PowerSeries:
+        """Return the average power usage for every full interval since the meter was started.
+
+        Each measurement is timestamped with the start of its interval. The series is aligned to the start time of the
+        meter, so a meter that was started at the same time as a :class:`PowerMeter` with the same
+        `measurement_interval` returns a series of the same length.
+
+        Args:
+            interval: Length of the intervals in simulated time
+        """
+        if not self.changes:
+            return PowerSeries(capacity=0)
+        start, end = self.changes.times[0], self._now()
+        grid = start + interval * np.arange(int((end - start) // interval) + 1)
+        times = np.append(self.changes.times, end)
+        average_power = []
+        for values in (self.changes.dynamic, self.changes.static):
+            cumulative_energy = np.concatenate(([0], np.cumsum(values * np.diff(times))))
+            average_power.append(np.diff(np.interp(grid, times, cumulative_energy)) / interval)
+        return PowerSeries.from_arrays(grid[:-1], *average_power)
+
+    def _now(self) -> float:
+        return self.env.now if self._end is None else self._end
+
+    def _on_change(self, entity: PowerAware):
+        new_power = entity.measure_power()
+        old_power = self._entity_power[entity]
+        if new_power.dynamic == old_power.dynamic and new_power.static == old_power.static:
+            return
+        self._entity_power[entity] = new_power
+        self._energy = self.energy()
+        if self._updates_until_resync > 0:
+            self.power = self.power + new_power - old_power
+            self._updates_until_resync -= 1
+        else:
+            self._resync_power()
+        self._record()
+        if self._power_thresholds:
+            self._check_power_thresholds()
+        if self._energy_budgets:
+            self._schedule_energy_budgets()
+
+    def _resync_power(self):
+        """Sum up the power of all entities to discard the rounding errors of the incremental updates.
+
+        The sum is computed after every `len(entities)` incremental updates, so the amortized costs per update stay
+        constant.
+        """
+        self.power = PowerMeasurement.sum(self._entity_power.values())
+        self._updates_until_resync = len(self._entity_power)
+
+    def _record(self):
+        """Store the current power usage, which is valid until the next call."""
+        if self._last_change == self.env.now and self.changes:
+            self.changes._set_last(self.power.dynamic, self.power.static)
+        else:
+            self.changes.append(self.env.now, self.power.dynamic, self.power.static)
+        self._last_change = self.env.now
+        logger.debug(f"{self.env.now}: {self.name}: {self.power}")
@@ -0,0 +1,186 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from leaf.infrastructure import Node
+from leaf.mobility import Location
+
+_Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    def __init__(self, cell_size: float, nodes: Iterable[Node] = ()):
+        """Uniform grid index for location-based queries over nodes.
+
+        Nodes are assigned to quadratic grid cells of side length `cell_size` according to their location. Queries only
+        inspect the cells around the queried location, so their cost depends on the local density of nodes instead of
+        the total number of nodes. For best performance, `cell_size` should be in the order of magnitude of the typical
+        query radius or nearest-neighbour distance.
+
+        All queries return the same results as a linear scan over the nodes in insertion order using
+        :meth:`Location.distance`: Nodes at equal distance are ordered by insertion.
+
+        The index registers itself as a location observer of its nodes, so it is updated automatically whenever a
+        node calls :meth:`Node.moved`.
+
+        Args:
+            cell_size: Side length of the grid cells
+            nodes: Nodes to be added to the index initially
+        """
+        if cell_size <= 0:
+            raise ValueError(f"cell_size has to be positive, got {cell_size}.")
+        self.cell_size = cell_size
+        self._cells: Dict[_Cell, Dict[Node, int]] = {}  # Nodes per cell mapped to their insertion sequence
+        self._node_cells: Dict[Node, _Cell] = {}
+        self._bounds: Optional[List[int]] = None  # [min_x, min_y, max_x, max_y] of all cells that were ever occupied
+        self._sequence = 0  # Insertion sequence of the next node
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._node_cells)
+
+    def __contains__(self, node: Node) -> bool:
+        return node in self._node_cells
+
+    def add(self, node: Node):
+        """Add a node to the index. The node must have a location."""
+        if node in self._node_cells:
+            raise ValueError(f"{node} is already part of the index.")
+        cell = self._cell(node.location)
+        self._insert(node, cell, self._sequence)
+        self._sequence += 1
+        node._observe_location(self)
+
+    def remove(self, node: Node):
+        """Remove a node from the index."""
+        cell = self._node_cells.pop(node)
+        nodes = self._cells[cell]
+        del nodes[node]
+        if not nodes:
+            del self._cells[cell]
+            if not self._cells:
+                self._bounds = None
+
+    def location_changed(self, node: Node):
+        """Move the node to the grid cell of its new location. Called via :meth:`Node.moved`."""
+        old_cell = self._node_cells.get(node)
+        if old_cell is None:
+            return  # Node was removed from the index
+        new_cell = self._cell(node.location)
+        if new_cell != old_cell:
+            sequence = self._cells[old_cell].pop(node)
+            if not self._cells[old_cell]:
+                del self._cells[old_cell]
+            self._insert(node, new_cell, sequence)
+
+    def nearest(self, location: Location) -> Optional[Node]:
+        """Return the node closest to `location` or None if the index is empty."""
+        nearest = self.k_nearest(location, 1)
+        return nearest[0] if nearest else None
+
+    def k_nearest(self, location: Location, k: int) -> List[Node]:
+        """Return the `k` nodes closest to `location`, ordered by distance.
+
+        Args:
+            location: Location to search from
+            k: Maximum number of nodes to return
+        """
+        if k <= 0 or not self._cells:
+            return []
+        k = min(k, len(self))
+        best: List[Tuple[float, int, Node]] = []  # Max-heap of the k best candidates via negated keys
+        for radius, cells in self._rings(self._cell(location)):
+            for cell in cells:
+                for node, sequence in self._cells.get(cell, {}).items():
+                    candidate = (-location.distance(node.location), -sequence, node)
+                    if len(best) < k:
+                        heapq.heappush(best, candidate)
+                    elif candidate[:2] > best[0][:2]:
+                        heapq.heapreplace(best, candidate)
+            if len(best) == k and -best[0][0] < self._ring_distance(radius):
+                break
+        return [node for _, _, node in sorted(best, key=lambda candidate: (-candidate[0], -candidate[1]))]
+
+    def in_range(self, location: Location, radius: float) -> List[Node]:
+        """Return all nodes within `radius` of `location` (inclusive) in insertion order."""
+        x0, y0 = self._cell(Location(location.x - radius, location.y - radius))
+        x1, y1 = self._cell(Location(location.x + radius, location.y + radius))
+        matches = {}
+        # The box is padded by one cell to be robust against rounding at its border
+        for x in range(x0 - 1, x1 + 2):
+            for y in range(y0 - 1, y1 + 2):
+                for node, sequence in self._cells.get((x, y), {}).items():
+                    if location.distance(node.location) <= radius:
+                        matches[node] = sequence
+        return sorted(matches, key=matches.__getitem__)
+
+    def nearest_many(self, locations: Sequence[Location]) -> List[Optional[Node]]:
+        """Return the closest node for each of the given locations.
+
+        Queries that fall into the same grid cell share their candidate nodes and are evaluated vectorized.
+        """
+        result: List[Optional[Node]] = [None] * len(locations)
+        if not self._cells:
+            return result
+        queries_per_cell: Dict[_Cell, List[int]] = {}
+        for i, location in enumerate(locations):
+            queries_per_cell.setdefault(self._cell(location), []).append(i)
+
+        for cell, query_indices in queries_per_cell.items():
+            query_x = np.array([locations[i].x for i in query_indices], dtype=float)[:, np.newaxis]
+            query_y = np.array([locations[i].y for i in query_indices], dtype=float)[:, np.newaxis]
+            candidates: List[Tuple[int, Node]] = []
+            for radius, cells in self._rings(cell):
+                for ring_cell in cells:
+                    candidates.extend((sequence, node) for node, sequence in self._cells.get(ring_cell, {}).items())
+                if not candidates:
+                    continue
+                candidates.sort(key=lambda candidate: candidate[0])
+                node_x = np.array([node.location.x for _, node in candidates], dtype=float)
+                node_y = np.array([node.location.y for _, node in candidates], dtype=float)
+                # Same operations as Location.distance, so that results are bit-identical
+                distances = np.sqrt((node_y - query_y) * (node_y - query_y) + (node_x - query_x) * (node_x - query_x))
+                nearest = np.argmin(distances, axis=1)  # First occurrence, i.e. lowest insertion sequence on ties
+                if distances[np.arange(len(query_indices)), nearest].max() < self._ring_distance(radius):
+                    break
+            for i, candidate_index in zip(query_indices, nearest):
+                result[i] = candidates[candidate_index][1]
+        return result
+
+    def _insert(self, node: Node, cell: _Cell, sequence: int):
+        self._cells.setdefault(cell, {})[node] = sequence
+        self._node_cells[node] = cell
+        x, y = cell
+        if self._bounds is None:
+            self._bounds = [x, y, x, y]
+        else:
+            self._bounds = [min(self._bounds[0], x), min(self._bounds[1], y),
+                            max(self._bounds[2], x), max(self._bounds[3], y)]
+
+    def _cell(self, location: Location) -> _Cell:
+        if location is None:
+            raise ValueError("Cannot index a node without location.")
+        return math.floor(location.x / self.cell_size), math.floor(location.y / self.cell_size)
+
+    def _rings(self, center: _Cell) -> Iterable[Tuple[int, List[_Cell]]]:
+        """Yield the cells at increasing Chebyshev distance from `center` until all non-empty cells were covered."""
+        cx, cy = center
+        min_x, min_y, max_x, max_y = self._bounds
+        max_radius = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+        yield 0, [center]
+        for radius in range(1, max_radius + 1):
+            ring = [(cx + dx, cy + radius) for dx in range(-radius, radius + 1)]
+            ring += [(cx + dx, cy - radius) for dx in range(-radius, radius + 1)]
+            ring += [(cx + radius, cy + dy) for dy in range(-radius + 1, radius)]
+            ring += [(cx - radius, cy + dy) for dy in range(-radius + 1, radius)]
+            yield radius, ring
+
+    def _ring_distance(self, radius: int) -> float:
+        """Lower bound for the distance of nodes outside of the ring `radius` to any location in the center cell.
+
+        Slightly reduced to be robust against rounding, so that nodes at equal distance are never missed.
+        """
+        return radius * self.cell_size * (1 - 1e-9)